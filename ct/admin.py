@@ -1,8 +1,20 @@
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
 from django.contrib import admin
+from django.http import FileResponse, StreamingHttpResponse
 
+from ct.logic.event import invalidate_availability, invalidate_event_infos
+from ct.logic.order import delete_order, remove_orders, send_email_invoice_and_tickets
+from ct.logic.pdf_store import get_or_render_pdf, purge_event_pdfs
+from ct.logic.reissue import generate_pdfs_zip, send_event_pdfs_in_background
+from ct.models.bank_transaction import BankTransaction, PaymentBalance
 from ct.models.event import Event
 from ct.models.customer import Customer
+from ct.models.fulfillment import FulfillmentJob
 from ct.models.order import Order
+from ct.models.reminder_run import ReminderRun
 from ct.models.ticket import Ticket
 
 
@@ -19,7 +31,62 @@ class OrderAdmin(admin.ModelAdmin):
         "is_refunded",
         "reminder_sent",
         "warning_sent",
+        "fulfillment_state",
     ]
+    list_select_related = ["fulfillment_job"]
+    actions = ["resend_pdf", "cancel_orders"]
+    # The reserved tickets of the event (Event.tickets_reserved) are only changed by the order form,
+    # cancellations and deletions, so everything which determines them is read-only here
+    reservation_fields = ["event", "number_discount", "number_regular", "is_deleted"]
+
+    def has_add_permission(self, request):
+        # Orders are created through the order form, which reserves their tickets
+        return False
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is not None:
+            return list(self.readonly_fields) + self.reservation_fields
+        return self.readonly_fields
+
+    def delete_model(self, request, obj):
+        remove_orders([obj])
+
+    def delete_queryset(self, request, queryset):
+        remove_orders(list(queryset))
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # E.g. orders which are marked as paid manually
+        invalidate_event_infos()
+        invalidate_availability()
+
+    @admin.action(description="Rechnung und Tickets erneut senden")
+    def resend_pdf(self, request, queryset):
+        # Served from the PDF store, unless the order or its event changed since the last rendering
+        for order in queryset.select_related("event").prefetch_related("ticket_set"):
+            pdf = get_or_render_pdf(order, list(order.ticket_set.all()))
+            send_email_invoice_and_tickets(order, BytesIO(pdf))
+        self.message_user(request, f"{len(queryset)} E-Mails versendet.")
+
+    @admin.action(description="Bestellungen stornieren")
+    def cancel_orders(self, request, queryset):
+        # Like a cancellation by the customer, including the confirmation email
+        num_cancelled = 0
+        for order in queryset:
+            try:
+                delete_order(order.reference_code, order.delete_code)
+                num_cancelled += 1
+            except RuntimeError:
+                # Already cancelled
+                pass
+        self.message_user(request, f"{num_cancelled} Bestellungen storniert.")
+
+    @admin.display(description="Versand")
+    def fulfillment_state(self, order):
+        try:
+            return order.fulfillment_job.display_state
+        except FulfillmentJob.DoesNotExist:
+            return "-"
 
 
 admin.site.register(Order, OrderAdmin)
@@ -33,13 +100,102 @@ admin.site.register(Customer, CustomerAdmin)
 
 
 class TicketAdmin(admin.ModelAdmin):
-    list_display = ["ticket_code", "type", "order"]
+    list_display = ["ticket_code", "type", "order", "checked_in_at"]
 
 admin.site.register(Ticket, TicketAdmin)
 
 
 class EventAdmin(admin.ModelAdmin):
-    list_display = ["key", "location", "datetime"]
+    list_display = ["key", "location", "datetime", "max_number_tickets", "tickets_reserved"]
+    readonly_fields = ["tickets_reserved"]
+    actions = ["download_pdfs", "send_pdfs"]
+
+    def get_readonly_fields(self, request, obj=None):
+        # A changed key would create a new event, as existing events are only updated
+        if obj is not None:
+            return self.readonly_fields + ["key"]
+        return self.readonly_fields
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        invalidate_event_infos()
+        invalidate_availability()
+        if change:
+            purge_event_pdfs(obj)
+
+    @admin.action(description="Rechnungen und Tickets neu erstellen (ZIP)")
+    def download_pdfs(self, request, queryset):
+        chunks = generate_pdfs_zip(list(queryset))
+        if settings.USE_ASYNC_VIEWS:
+            # Django 4.1 iterates streaming responses inside the event loop, where the queries and
+            # the rendering cannot run. The archive is written to a temporary file here instead,
+            # which is deleted once the response is closed.
+            file = tempfile.TemporaryFile()
+            for chunk in chunks:
+                file.write(chunk)
+            file.seek(0)
+            return FileResponse(
+                file, as_attachment=True, filename="tickets.zip", content_type="application/zip"
+            )
+
+        response = StreamingHttpResponse(chunks, content_type="application/zip")
+        response["Content-Disposition"] = 'attachment; filename="tickets.zip"'
+        return response
+
+    @admin.action(description="Rechnungen und Tickets neu erstellen und per E-Mail versenden")
+    def send_pdfs(self, request, queryset):
+        send_event_pdfs_in_background(list(queryset))
+        self.message_user(
+            request,
+            "Die Rechnungen und Tickets werden im Hintergrund erstellt und versendet.",
+        )
 
 
 admin.site.register(Event, EventAdmin)
+
+
+class FulfillmentJobAdmin(admin.ModelAdmin):
+    list_display = [
+        "order",
+        "state",
+        "attempts",
+        "created_date",
+        "next_attempt_date",
+        "finished_date",
+        "locked_by",
+    ]
+    list_filter = ["state"]
+
+
+admin.site.register(FulfillmentJob, FulfillmentJobAdmin)
+
+
+class BankTransactionAdmin(admin.ModelAdmin):
+    list_display = ["booking_date", "reference_text", "reference_code", "amount", "import_date"]
+    search_fields = ["reference_code", "reference_text"]
+
+
+admin.site.register(BankTransaction, BankTransactionAdmin)
+
+
+class PaymentBalanceAdmin(admin.ModelAdmin):
+    list_display = ["reference_code", "balance", "payment_date", "refund_date"]
+    search_fields = ["reference_code"]
+
+
+admin.site.register(PaymentBalance, PaymentBalanceAdmin)
+
+
+class ReminderRunAdmin(admin.ModelAdmin):
+    list_display = [
+        "started_date",
+        "kind",
+        "state",
+        "num_total",
+        "num_sent",
+        "num_failed",
+        "finished_date",
+    ]
+
+
+admin.site.register(ReminderRun, ReminderRunAdmin)
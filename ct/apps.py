@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class ConcertTicketsConfig(AppConfig):
     name = 'ct'
+
+    def ready(self):
+        # Registers the signal handlers which invalidate the event cache
+        import ct.logic.event_cache  # noqa: F401
@@ -12,6 +12,19 @@ BANK_TRANSFER_TIME_DAYS = 2
 PAYMENT_GRACE_PERIOD_DAYS = 14
 WARNING_GRACE_PERIOD_DAYS = 7
 
+# Payment reminders are sent in the background in batches, by a bounded pool of threads
+REMINDER_MAX_WORKERS = 2
+REMINDER_BATCH_SIZE = 25
+REMINDER_MAX_EMAILS_PER_MINUTE = 60
+# Runs which did not report progress for this long are considered abandoned (e.g. the process was
+# restarted) and no longer block new runs
+REMINDER_RUN_STALE_SECONDS = 10 * 60
+# Running runs report that they are alive this often, also while their batches are still queued
+REMINDER_RUN_HEARTBEAT_SECONDS = 60
+
+# Reissued invoices and tickets are sent in batches over a shared SMTP session
+REISSUE_EMAIL_BATCH_SIZE = 25
+
 NAME_ORCHESTRA = "Fantasie Philharmonie"
 NAME_ORCHESTRA_FULL = NAME_ORCHESTRA + " e.V."
 
@@ -19,6 +32,11 @@ EMAIL_SERVER = "smtp.your-email-server"
 EMAIL_PORT = 587
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
 SENDER_EMAIL = "tickets@your-orchestra.de"
+EMAIL_TIMEOUT_SECONDS = 30
+# Authenticated SMTP sessions are kept open and reused for several emails
+EMAIL_POOL_SIZE = 4
+EMAIL_MAX_MESSAGES_PER_CONNECTION = 100
+EMAIL_POOL_IDLE_TIMEOUT_SECONDS = 30
 
 IBAN = "DE00 0000 0000 0000 0000"
 BIC = "YOURBIC"
@@ -41,8 +59,45 @@ FOOTER_INVOICE = [
     "Steuernummer: ..., Finanzamt ...",
 ]
 
+# The dashboard statistics are invalidated on every change, this is only an upper bound
+EVENT_INFOS_CACHE_SECONDS = 10 * 60
+
+# The remaining tickets shown in the order form. Invalidated when an order is created or cancelled.
+AVAILABILITY_CACHE_SECONDS = 10
+
+# Changed events are picked up by the per-process event cache of other processes after at most
+# this time, see ct.logic.event_cache
+EVENT_CACHE_CHECK_INTERVAL_SECONDS = 2
+
+# Tickets API for the scanner devices
+TICKETS_API_MAX_PAGE_SIZE = 5000
+# The returned sync timestamp lies slightly in the past, so that orders from transactions which
+# were still running during the sync are included in the next sync
+TICKETS_API_SYNC_OVERLAP_SECONDS = 5
+CHECK_IN_MAX_BATCH_SIZE = 500
+
+# Metrics of every process are written to the shared cache at most this often
+METRICS_FLUSH_INTERVAL_SECONDS = 10
+METRICS_CACHE_SECONDS = 24 * 60 * 60
+
 BASE_URL = "https://tickets.your-orchestra.de"
 
 EMAIL_CLOSING = f"""Johann S. Bach
 i.A. {NAME_ORCHESTRA}
 """
+
+# Fulfillment queue: PDF rendering and sending of the invoice email happen in worker processes
+FULFILLMENT_MAX_ATTEMPTS = 5
+FULFILLMENT_RETRY_BASE_SECONDS = 30
+FULFILLMENT_RETRY_MAX_SECONDS = 60 * 60
+# Jobs which are locked longer than this are considered abandoned (e.g. crashed worker) and are picked up again
+FULFILLMENT_LOCK_TIMEOUT_SECONDS = 10 * 60
+FULFILLMENT_POLL_INTERVAL_SECONDS = 2
+
+# Processes which render invoices and tickets, per process which renders. 0 renders in the calling
+# process instead. Without RENDER_POOL_SIZE, run_fulfillment_worker --processes N divides the cores
+# by N.
+RENDER_POOL_SIZE = int(os.getenv("RENDER_POOL_SIZE", os.cpu_count() or 1))
+
+# Threads per process for the blocking work of the async views (USE_ASYNC_VIEWS)
+ASYNC_VIEW_THREADS = int(os.getenv("ASYNC_VIEW_THREADS", 32))
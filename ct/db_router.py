@@ -0,0 +1,117 @@
+import contextvars
+import logging
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+REPLICA_DB = "replica"
+# Requests of a client which wrote something recently read from the primary, so that the client
+# sees its own changes
+PRIMARY_COOKIE_NAME = "ct_primary_until"
+# The lag of the replica is checked at most this often per process
+REPLICA_LAG_CHECK_INTERVAL_SECONDS = 1
+
+logger = logging.getLogger(__name__)
+
+_use_replica = contextvars.ContextVar("use_replica", default=False)
+
+
+class ReplicaRouter:
+    # Reads go to the replica only inside use_replica() and only if the replica is recent enough.
+    # Everything else, including all writes, goes to the primary.
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and is_replica_usable():
+            return REPLICA_DB
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both databases contain the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # A PostgreSQL replica receives the schema by replication, the local SQLite replica by
+        # sync_replica
+        return db == "default"
+
+
+@contextmanager
+def use_replica():
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def replica_reads(view):
+    # Serves GET and HEAD requests of a read-only view from the replica. Requests which can change
+    # data and clients which changed data shortly before are served by the primary.
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not should_use_replica(request):
+            return view(request, *args, **kwargs)
+        with use_replica():
+            return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def should_use_replica(request) -> bool:
+    return (
+        REPLICA_DB in settings.DATABASES
+        and request.method in ("GET", "HEAD")
+        and get_primary_until(request) <= time.time()
+    )
+
+
+def get_primary_until(request) -> float:
+    try:
+        return float(request.COOKIES.get(PRIMARY_COOKIE_NAME, 0))
+    except ValueError:
+        return 0.0
+
+
+_lag_checked_at = 0.0
+_is_usable = False
+
+
+def is_replica_usable() -> bool:
+    global _lag_checked_at, _is_usable
+    if time.monotonic() - _lag_checked_at >= REPLICA_LAG_CHECK_INTERVAL_SECONDS:
+        _lag_checked_at = time.monotonic()
+        try:
+            _is_usable = get_replica_lag() <= settings.REPLICA_MAX_LAG_SECONDS
+        except Exception:
+            logger.exception("Checking the lag of the replica failed")
+            _is_usable = False
+    return _is_usable
+
+
+def get_replica_lag() -> float:
+    connection = connections[REPLICA_DB]
+    if connection.vendor == "postgresql":
+        # An idle primary does not advance the replay timestamp, so a replica which has replayed
+        # everything it received has no lag
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+            )
+            return float(cursor.fetchone()[0] or 0)
+
+    # Local SQLite replica: lagging since its last sync, if the primary was changed afterwards
+    if connection.settings_dict["NAME"] == connections["default"].settings_dict["NAME"]:
+        # Mirror of the primary in tests
+        return 0.0
+    primary_changed = os.path.getmtime(connections["default"].settings_dict["NAME"])
+    replica_synced = os.path.getmtime(connection.settings_dict["NAME"])
+    if primary_changed <= replica_synced:
+        return 0.0
+    return time.time() - replica_synced
@@ -1,9 +1,8 @@
 from django import forms
 from django.utils.safestring import mark_safe
 from ct.constants import TICKET_PRICE_DISCOUNT, TICKET_PRICE_REGULAR
-from ct.logic.event import get_remaining_tickets
-
-from ct.models.event import Event
+from ct.logic.event import get_availability_snapshot
+from ct.logic.event_cache import get_active_events
 
 
 class CreateOrderForm(forms.Form):
@@ -28,16 +27,18 @@ class CreateOrderForm(forms.Form):
         label=mark_safe("Ich stimme den <a href='agb' target='_blank'>AGB</a> zu."),
     )
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, show_remaining_tickets=True, **kwargs):
         super(CreateOrderForm, self).__init__(*args, **kwargs)
 
-        # Display all active events
-        events = Event.objects.filter(is_active=True)
-
-        # Add count of remaining tickets to event choice label
-        self.fields["event"].choices = [
-            (e.key, f"{e} ({get_remaining_tickets(e.key)} Plätze verfügbar)") for e in events
-        ]
+        if show_remaining_tickets:
+            # Display all active events with the count of remaining tickets
+            self.fields["event"].choices = [
+                (e["key"], f"{e['name']} ({e['remaining_tickets']} Plätze verfügbar)")
+                for e in get_availability_snapshot()
+            ]
+        else:
+            # For the cached order page, which fills in the remaining tickets itself (see order.js)
+            self.fields["event"].choices = [(e.key, e.label) for e in get_active_events()]
 
     def clean(self):
         cleaned_data = super().clean()
@@ -48,3 +49,8 @@ class CreateOrderForm(forms.Form):
 
 class BankStatementForm(forms.Form):
     file = forms.FileField(label="Wähle CSV aus")
+    dry_run = forms.BooleanField(
+        initial=False,
+        required=False,
+        label="Nur Report erstellen, keine Zahlungen in der Datenbank speichern",
+    )
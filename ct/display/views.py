@@ -1,17 +1,28 @@
-from ct.constants import DELETE_ORDER_DAYS_BEFORE_CONCERT, SENDER_EMAIL
+from ct.constants import (AVAILABILITY_CACHE_SECONDS,
+                          DELETE_ORDER_DAYS_BEFORE_CONCERT, SENDER_EMAIL)
 from ct.display.forms import BankStatementForm, CreateOrderForm
-from ct.logic.bank_statement import process_bank_statement
+from ct.logic.bank_statement import generate_report_csv, process_bank_statement
 from ct.logic.customer import add_to_newsletter
-from ct.logic.event import get_event_infos
-from ct.logic.invoice import create_invoice_and_tickets
-from ct.logic.order import (can_order_be_deleted, create_order, delete_order,
-                             is_order_deleted, send_email_invoice_and_tickets)
+from ct.logic.async_executor import run_blocking
+from ct.logic.event import get_availability_snapshot, get_event_infos
+from ct.logic.event_cache import get_active_events
+from ct.logic.fulfillment import enqueue_fulfillment
+from ct.logic.metrics import render_metrics
+from ct.logic.order import can_order_be_deleted, create_order, delete_order
 from ct.logic.payment_reminder import send_payment_reminder
 from ct.logic.permissions import is_superuser
+from ct.models.order import Order
+from ct.models.reminder_run import ReminderRun
+from django.conf import settings
 from django.contrib.auth.decorators import user_passes_test
 from django.contrib.auth.views import LoginView, LogoutView
-from django.http import HttpRequest, HttpResponse
+from django.db import transaction
+from django.http import HttpRequest, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control
+from django.views.decorators.cache import cache_control
 
 
 def create_order_view(request: HttpRequest) -> HttpResponse:
@@ -32,14 +43,14 @@ def create_order_view(request: HttpRequest) -> HttpResponse:
             allows_advertising = form.cleaned_data["allows_advertising"]
 
             try:
-                order = create_order(
-                    name, address, email, event_id, number_discount, number_regular
-                )
+                # Invoice and tickets are rendered and sent by the fulfillment workers
+                with transaction.atomic():
+                    order = create_order(
+                        name, address, email, event_id, number_discount, number_regular
+                    )
+                    enqueue_fulfillment(order)
                 if allows_advertising:
                     add_to_newsletter(email)
-                pdf = create_invoice_and_tickets(order)
-
-                send_email_invoice_and_tickets(order, pdf)
             except Exception as e:
                 return render(
                     request,
@@ -61,23 +72,91 @@ def create_order_view(request: HttpRequest) -> HttpResponse:
                     )
                 },
             )
+    elif is_cached_page_allowed(request):
+        # Anonymous visitors, i.e. nearly all of them, get the cached page
+        return HttpResponse(get_cached_order_page())
     else:
         form = CreateOrderForm()
 
     return render(request, "create_order.html", {"form": form})
 
 
+# The order page for anonymous visitors is rendered once per process and set of active events.
+# It contains neither the remaining tickets nor a CSRF token, both are filled in by order.js from
+# the availability endpoint. Visitors without JavaScript follow the link to "?uncached".
+_order_page = (None, "")
+
+
+def is_cached_page_allowed(request: HttpRequest) -> bool:
+    return settings.SESSION_COOKIE_NAME not in request.COOKIES and "uncached" not in request.GET
+
+
+def get_cached_order_page() -> str:
+    global _order_page
+    active_events = get_active_events()
+    if _order_page[0] is not active_events:
+        form = CreateOrderForm(show_remaining_tickets=False)
+        _order_page = (
+            active_events,
+            render_to_string("create_order.html", {"form": form, "is_cached": True}),
+        )
+    return _order_page[1]
+
+
+@cache_control(private=True, max_age=AVAILABILITY_CACHE_SECONDS)
+def availability(request: HttpRequest) -> JsonResponse:
+    # Remaining tickets per event and the CSRF token, for the cached order page
+    return JsonResponse(get_availability_response(request, get_availability_snapshot()))
+
+
+def get_availability_response(request: HttpRequest, snapshot: list[dict]) -> dict:
+    # get_token also sets the CSRF cookie
+    return {
+        "csrf_token": get_token(request),
+        "remaining_tickets": {e["key"]: e["remaining_tickets"] for e in snapshot},
+    }
+
+
+async def create_order_view_async(request: HttpRequest) -> HttpResponse:
+    if request.method == "GET" and is_cached_page_allowed(request):
+        return HttpResponse(await run_blocking(get_cached_order_page)())
+    # Creating an order needs a transaction, which the async ORM does not support
+    return await run_blocking(create_order_view)(request)
+
+
+async def availability_async(request: HttpRequest) -> JsonResponse:
+    # cache_control does not support async views in Django 4.1. The snapshot reads the shared
+    # cache, which is file-based when deployed, so it is taken in the executor.
+    snapshot = await run_blocking(get_availability_snapshot)()
+    response = JsonResponse(get_availability_response(request, snapshot))
+    patch_cache_control(response, private=True, max_age=AVAILABILITY_CACHE_SECONDS)
+    return response
+
+
 def delete_order_view(
     request: HttpRequest, reference_code: str, delete_code: str
 ) -> HttpResponse:
-    if is_order_deleted(reference_code):
+    order = Order.objects.select_related("event").get(pk=reference_code)
+    return respond_to_delete_order(request, order, delete_code)
+
+
+async def delete_order_view_async(
+    request: HttpRequest, reference_code: str, delete_code: str
+) -> HttpResponse:
+    order = await Order.objects.select_related("event").aget(pk=reference_code)
+    # Deleting needs a transaction and sends an email
+    return await run_blocking(respond_to_delete_order)(request, order, delete_code)
+
+
+def respond_to_delete_order(request: HttpRequest, order: Order, delete_code: str) -> HttpResponse:
+    if order.is_deleted:
         return render(
             request,
             "generic_message.html",
             {"message": "Die Bestellung wurde bereits storniert."},
         )
 
-    if not can_order_be_deleted(reference_code):
+    if not can_order_be_deleted(order):
         return render(
             request,
             "generic_message.html",
@@ -94,10 +173,10 @@ def delete_order_view(
         return render(request, "confirm_delete_order.html")
     else:
         try:
-            delete_order(reference_code, delete_code)
+            delete_order(order.reference_code, delete_code)
             return render(request, "delete_order_success.html")
         except RuntimeError as e:
-            return render(request, "generic_message", {"message": str(e)})
+            return render(request, "generic_message.html", {"message": str(e)})
 
 
 def agb(request: HttpRequest) -> HttpResponse:
@@ -110,13 +189,17 @@ def upload_statement(request: HttpRequest) -> HttpResponse:
         form = BankStatementForm(request.POST, request.FILES)
         if form.is_valid():
             # Read and process the CSV file
-            report = process_bank_statement(form.cleaned_data["file"])
+            report = process_bank_statement(
+                form.cleaned_data["file"], dry_run=form.cleaned_data["dry_run"]
+            )
 
-            response = HttpResponse(content_type="text/csv; charset=utf-8")
+            response = StreamingHttpResponse(
+                (line.encode("utf-8") for line in generate_report_csv(report)),
+                content_type="text/csv; charset=utf-8",
+            )
             response["Content-Disposition"] = (
                 'attachment; filename="übersicht_kartenzahlungen.csv"'
             )
-            response.write(report.encode("utf-8"))
 
             return response
     else:
@@ -142,15 +225,27 @@ def dashboard(request: HttpRequest) -> HttpResponse:
     return render(request, "dashboard.html", {"event_infos": event_infos})
 
 
+@user_passes_test(is_superuser)
+def metrics(request: HttpRequest) -> HttpResponse:
+    # Text format of Prometheus
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @user_passes_test(is_superuser)
 def payment_reminder(request: HttpRequest) -> HttpResponse:
     if request.method == "POST":
-        send_payment_reminder()
+        runs = send_payment_reminder()
 
-        success_message = (
-            "Zahlungserinnerungen werden im Hintergrund versendet. "
-            "Es kann ein paar Minuten dauern, bis alle Erinnerungen verschickt wurden."
-        )
+        if runs:
+            success_message = (
+                "Zahlungserinnerungen werden im Hintergrund versendet. "
+                "Der Fortschritt kann auf der Seite der Zahlungserinnerungen verfolgt werden."
+            )
+        else:
+            success_message = (
+                "Es werden bereits Zahlungserinnerungen versendet. "
+                "Bitte warten, bis der laufende Versand abgeschlossen ist."
+            )
 
         return render(
             request,
@@ -158,4 +253,5 @@ def payment_reminder(request: HttpRequest) -> HttpResponse:
             {"message": success_message},
         )
 
-    return render(request, "payment_reminder.html")
+    runs = ReminderRun.objects.order_by("-started_date")[:10]
+    return render(request, "payment_reminder.html", {"runs": runs})
@@ -0,0 +1,62 @@
+import copy
+from functools import lru_cache
+from pathlib import Path
+
+from reportlab.lib.utils import ImageReader, _digester
+from reportlab.pdfbase.pdfdoc import PDFImageXObject
+
+STATIC_DIR = Path(__file__).parent.parent / "static" / "ct"
+
+# All images which are drawn on invoices and tickets
+ASSET_FILENAMES = ["logo.png", "sponsor1.jpg", "sponsor2.png"]
+
+
+class CachedImage:
+    # An image which is decoded and compressed once per process. It is embedded into each PDF
+    # only once as an image XObject, no matter how often it is drawn.
+    def __init__(self, path: Path):
+        reader = ImageReader(str(path))
+        self.width, self.height = reader.getSize()
+        self.name = _digester(str(path).encode("utf-8"))
+        self.xobject = PDFImageXObject(self.name, reader, mask=None)
+
+
+@lru_cache(maxsize=None)
+def get_image(filename: str) -> CachedImage:
+    return CachedImage(STATIC_DIR / filename)
+
+
+def preload_assets() -> None:
+    # Decodes all images up front, e.g. in a new render process before its first job
+    for filename in ASSET_FILENAMES:
+        if (STATIC_DIR / filename).exists():
+            get_image(filename)
+
+
+def draw_image(canvas, filename: str, x, y, width=None, height=None):
+    image = get_image(filename)
+
+    if width is None and height is not None:
+        width = (height / image.height) * image.width
+    elif height is None and width is not None:
+        height = (width / image.width) * image.height
+
+    # Same as canvas.drawImage, but registers the already compressed image data instead of
+    # decoding and compressing the file again for every document. This relies on internals of
+    # ReportLab, which is therefore pinned in requirements.txt, see ct.tests.test_assets.
+    doc = canvas._doc
+    reg_name = doc.getXObjectName(image.name)
+    if not doc.idToObject.get(reg_name):
+        # The XObject is copied, as the document stores per-document state on it
+        xobject = copy.copy(image.xobject)
+        canvas._setXObjects(xobject)
+        doc.Reference(xobject, reg_name)
+        doc.addForm(image.name, xobject)
+
+    canvas._currentPageHasImages = 1
+    canvas.saveState()
+    canvas.translate(x, y)
+    canvas.scale(width, height)
+    canvas._code.append(f"/{reg_name} Do")
+    canvas.restoreState()
+    canvas._formsinuse.append(image.name)
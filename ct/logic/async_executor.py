@@ -0,0 +1,48 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from ct.constants import ASYNC_VIEW_THREADS
+
+# Blocking work of the async views (transactions, SMTP, templates, DRF) runs in this pool, so that
+# the event loop keeps serving other connections. Unlike sync_to_async with thread_sensitive=True,
+# the calls do not wait for each other on a single shared thread.
+executor = ThreadPoolExecutor(max_workers=ASYNC_VIEW_THREADS, thread_name_prefix="async-views")
+
+
+def run_blocking(func):
+    # Returns an async function which calls func in the executor
+    def call(*args, **kwargs):
+        # The threads outlive the requests, so their database connections are closed like at the
+        # end of a request
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(call, thread_sensitive=False, executor=executor)
+
+
+def run_view_in_executor(view):
+    # Async wrapper of a synchronous view, which runs completely in the executor
+    def respond(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if hasattr(response, "render"):
+            # DRF and template responses
+            response.render()
+        if response.streaming:
+            # Django 4.1 iterates streaming responses inside the event loop, where no queries are
+            # allowed, so the content is generated here. This holds the whole content in memory,
+            # so views must only return bounded streams in async mode (e.g. the tickets API
+            # returns at most one page).
+            response.streaming_content = list(response.streaming_content)
+        return response
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await run_blocking(respond)(request, *args, **kwargs)
+
+    return wrapper
@@ -1,101 +1,218 @@
 import csv
+import hashlib
+from collections import Counter
 from datetime import datetime
+from decimal import Decimal
 from io import TextIOWrapper
 
+from django.db import transaction
+from django.utils import timezone
+
+from ct.logic.event import invalidate_event_infos
+from ct.logic.metrics import timed
 from ct.logic.order import calculate_ticket_price
+from ct.models.bank_transaction import BankTransaction, PaymentBalance
 from ct.models.order import Order
 
+REPORT_HEADER = ["Fehlertyp", "Verwendungstext", "Beschreibung"]
+
+# The only order fields which are changed by the reconciliation
+PAYMENT_FIELDS = ["is_paid", "payment_date", "is_refunded", "refund_date"]
+
+LEDGER_QUERY_BATCH_SIZE = 500
 
-def process_bank_statement(file) -> str:
+
+@timed("process_bank_statement")
+def process_bank_statement(file, dry_run: bool = False) -> list:
     file_wrapper = TextIOWrapper(file.file, encoding="utf-8")
     reader = csv.DictReader(file_wrapper, delimiter=";")
 
-    payments_per_reference_code = calculate_payments_per_reference_code(reader)
-    return generate_payments_report(payments_per_reference_code)
+    transactions = parse_bank_statement(reader)
+
+    with transaction.atomic():
+        # Statements usually overlap, only rows which were not imported before are processed
+        new_transactions = filter_new_transactions(transactions)
+        payments_per_reference_code = update_payment_balances(new_transactions, dry_run)
+        report = generate_payments_report(payments_per_reference_code, dry_run)
+
+    if not dry_run:
+        invalidate_event_infos()
+    return report
+
+
+class Echo:
+    # Pseudo buffer for the csv writer, which returns the written line instead of storing it
+    def write(self, value):
+        return value
 
 
-def calculate_payments_per_reference_code(reader):
-    # We first create a dictionary of reference_codes:payment_details, as that will help with
-    # dealing with refunded tickets and payments paid in multiple installments (e.g.
-    # if user sent wrong amount at first).
-    payments = {}
+def generate_report_csv(report):
+    writer = csv.writer(Echo(), delimiter=";", lineterminator="\n")
+    yield writer.writerow(REPORT_HEADER)
+    for row in report:
+        yield writer.writerow(row)
+
+
+def parse_bank_statement(reader) -> list[BankTransaction]:
+    transactions = []
+    # Identical rows (e.g. two equal transfers on the same day) are told apart by their occurrence
+    occurrences = Counter()
 
     for row in reader:
-        date = datetime.strptime(row["Buchungstag"], r"%d.%m.%Y")
+        date = timezone.make_aware(datetime.strptime(row["Buchungstag"], r"%d.%m.%Y"))
         reference_text = row["Verwendungszweck"]
-        amount = float(row["Betrag"].replace(",", "."))
-
-        # The reference text should start with "Karten XXXXXXXX" or "Stornierung Karten XXXXXXXX",
-        # with XXXXXXXX being the reference code.
-        if " " in reference_text:
-            parts = reference_text.strip().split(" ")
-            if parts[0] == "Stornierung":
-                reference_code = parts[2]
-            else:
-                reference_code = parts[1]
-        else:
-            reference_code = reference_text.strip()[-8:].strip()
-
-        if reference_code in payments:
-            # This reference_code already occured before in the account statement
-            # Load what we already stored from the previous rows
-            current_balance = payments[reference_code]["balance"]
-            current_payment_date = payments[reference_code]["payment_date"]
-            current_refund_date = payments[reference_code]["refund_date"]
-
-            # Update the balance and the dates where applicable
-            payments[reference_code] = {
-                "balance": current_balance + amount,
-                "payment_date": date if amount > 0 else current_payment_date,
-                "refund_date": date if amount < 0 else current_refund_date,
-            }
+        amount = Decimal(row["Betrag"].replace(",", "."))
+
+        row_key = "|".join([row["Buchungstag"], reference_text, row["Betrag"]])
+        occurrences[row_key] += 1
+        dedup_key = hashlib.sha256(
+            f"{row_key}|{occurrences[row_key]}".encode("utf-8")
+        ).hexdigest()
+
+        transactions.append(
+            BankTransaction(
+                dedup_key=dedup_key,
+                booking_date=date,
+                reference_text=reference_text,
+                reference_code=extract_reference_code(reference_text),
+                amount=amount,
+            )
+        )
+
+    return transactions
+
+
+def extract_reference_code(reference_text: str) -> str:
+    # The reference text should start with "Karten XXXXXXXX" or "Stornierung Karten XXXXXXXX",
+    # with XXXXXXXX being the reference code.
+    if " " in reference_text:
+        parts = reference_text.strip().split(" ")
+        if parts[0] == "Stornierung":
+            return parts[2]
         else:
-            # This is the first row for this reference_code
-            payments[reference_code] = {
-                "balance": amount,
-                "payment_date": date if amount > 0 else None,
-                "refund_date": date if amount < 0 else None,
-            }
+            return parts[1]
+    else:
+        return reference_text.strip()[-8:].strip()
+
+
+def filter_new_transactions(transactions: list[BankTransaction]) -> list[BankTransaction]:
+    dedup_keys = [t.dedup_key for t in transactions]
+    known_keys = set()
+    for i in range(0, len(dedup_keys), LEDGER_QUERY_BATCH_SIZE):
+        known_keys.update(
+            BankTransaction.objects.filter(
+                dedup_key__in=dedup_keys[i : i + LEDGER_QUERY_BATCH_SIZE]
+            ).values_list("dedup_key", flat=True)
+        )
+    return [t for t in transactions if t.dedup_key not in known_keys]
 
-    return payments
 
+def update_payment_balances(new_transactions: list[BankTransaction], dry_run: bool = False):
+    # Adds the new transactions to the stored balances of their reference codes. We keep a balance
+    # per reference code, as that will help with dealing with refunded tickets and payments paid in
+    # multiple installments (e.g. if user sent wrong amount at first).
+    # Returns the payment details of all reference codes affected by the new transactions.
+    reference_codes = {t.reference_code for t in new_transactions}
+    balances = PaymentBalance.objects.select_for_update().in_bulk(list(reference_codes))
 
-def generate_payments_report(payment_details) -> str:
-    # Create a csv report with information on all payments in the bank statement
-    report = "Fehlertyp;Verwendungstext;Beschreibung\n"
+    for t in new_transactions:
+        balance = balances.get(t.reference_code)
+        if balance is None:
+            # This is the first transaction for this reference_code
+            balance = PaymentBalance(reference_code=t.reference_code)
+            balances[t.reference_code] = balance
+
+        # Update the balance and the dates where applicable
+        balance.balance += t.amount
+        if t.amount > 0 and (balance.payment_date is None or t.booking_date >= balance.payment_date):
+            balance.payment_date = t.booking_date
+        if t.amount < 0 and (balance.refund_date is None or t.booking_date >= balance.refund_date):
+            balance.refund_date = t.booking_date
+
+    if not dry_run:
+        now = timezone.now()
+        for t in new_transactions:
+            t.import_date = now
+        BankTransaction.objects.bulk_create(new_transactions, batch_size=500)
+        PaymentBalance.objects.bulk_create(
+            [b for b in balances.values() if b._state.adding], batch_size=500
+        )
+        PaymentBalance.objects.bulk_update(
+            [b for b in balances.values() if not b._state.adding],
+            ["balance", "payment_date", "refund_date"],
+            batch_size=500,
+        )
+
+    return {
+        reference_code: {
+            "balance": balance.balance,
+            "payment_date": balance.payment_date,
+            "refund_date": balance.refund_date,
+        }
+        for reference_code, balance in balances.items()
+    }
+
+
+def generate_payments_report(payment_details, dry_run: bool = False) -> list:
+    # Create a report with information on all payments in the bank statement. Each row consists of
+    # the error type, the reference code and a description.
+    report = []
+
+    # Fetch all orders of the bank statement at once
+    orders = Order.objects.in_bulk(list(payment_details.keys()))
+    changed_orders = []
 
     # Now that we calculated the details for each order, compare that with the order properties to
     # determine which orders are succesfully paid, wrongly paid, or need to be refunded.
     for reference_code, payment_details in payment_details.items():
-        try:
-            order = Order.objects.get(pk=reference_code)
-
-            if payment_details["balance"] == 0.0:
-                report = handle_zero_balance(
-                    reference_code, order, payment_details, report
-                )
-            elif payment_details["balance"] > 0.0:
-                report = handle_positive_balance(
-                    reference_code, order, payment_details, report
-                )
-            else:
-                report += (
-                    f"FALSCHE_ERSTATTUNG;{reference_code};Bestellung {reference_code} wurde inkorrekt erstattet. "
-                    f"Überwiesener Betrag minus erstatteter Betrag ist {payment_details['balance']}. Bitte überprüfen.\n"
-                )
-
-            order.save()
-
-        except Order.DoesNotExist:
-            report += (
-                f"NICHT_ZUORDENBAR;{reference_code};Buchungsnummer '{reference_code}' "
-                "konnte keiner Bestellung zugeordnet werden.\n"
+        order = orders.get(reference_code)
+
+        if order is None:
+            report.append(
+                [
+                    "NICHT_ZUORDENBAR",
+                    reference_code,
+                    f"Buchungsnummer '{reference_code}' konnte keiner Bestellung zugeordnet werden.",
+                ]
+            )
+            continue
+
+        payment_state_before = get_payment_state(order)
+
+        if payment_details["balance"] == 0.0:
+            handle_zero_balance(reference_code, order, payment_details, report)
+        elif payment_details["balance"] > 0.0:
+            handle_positive_balance(reference_code, order, payment_details, report)
+        else:
+            report.append(
+                [
+                    "FALSCHE_ERSTATTUNG",
+                    reference_code,
+                    f"Bestellung {reference_code} wurde inkorrekt erstattet. "
+                    f"Überwiesener Betrag minus erstatteter Betrag ist {payment_details['balance']}. Bitte überprüfen.",
+                ]
             )
 
+        if get_payment_state(order) != payment_state_before:
+            changed_orders.append(order)
+
+    # Only orders whose payment state actually changed are written, with a single query per batch
+    if changed_orders and not dry_run:
+        now = timezone.now()
+        for order in changed_orders:
+            order.last_modified = now
+        Order.objects.bulk_update(
+            changed_orders, PAYMENT_FIELDS + ["last_modified"], batch_size=500
+        )
+
     return report
 
 
-def handle_zero_balance(reference_code, order, payment_details, report) -> str:
+def get_payment_state(order) -> tuple:
+    return tuple(getattr(order, field) for field in PAYMENT_FIELDS)
+
+
+def handle_zero_balance(reference_code, order, payment_details, report) -> None:
     if not order.is_paid:
         # If the balance is 0, there had to be a payment already, as you cannot transfer 0 €
         order.is_paid = True
@@ -103,40 +220,52 @@ def handle_zero_balance(reference_code, order, payment_details, report) -> str:
 
     if order.is_deleted:
         if not order.is_refunded:
-            report += f"ERFOLGREICHE_ERSTATTUNG;{reference_code};Bestellung {reference_code} wurde erstattet.\n"
+            report.append(
+                [
+                    "ERFOLGREICHE_ERSTATTUNG",
+                    reference_code,
+                    f"Bestellung {reference_code} wurde erstattet.",
+                ]
+            )
             order.is_refunded = True
             order.refund_date = payment_details["refund_date"]
     else:
-        report += (
-            f"FALSCHE_ERSTATTUNG;{reference_code};Bestellung {reference_code} "
-            "wurde fälschlicherweise erstattet. Die Bestellung wurde nicht durch den "
-            "Kunden storniert.\n"
+        report.append(
+            [
+                "FALSCHE_ERSTATTUNG",
+                reference_code,
+                f"Bestellung {reference_code} wurde fälschlicherweise erstattet. Die Bestellung "
+                "wurde nicht durch den Kunden storniert.",
+            ]
         )
-    return report
 
 
-def handle_positive_balance(reference_code, order, payment_details, report) -> str:
+def handle_positive_balance(reference_code, order, payment_details, report) -> None:
     if order.is_deleted:
-        report += (
-            f"ERSTATTUNG_NOTWENDIG;{reference_code};Für Bestellung {reference_code} müssen "
-            f"{payment_details['balance']} € erstattet werden.\n"
+        report.append(
+            [
+                "ERSTATTUNG_NOTWENDIG",
+                reference_code,
+                f"Für Bestellung {reference_code} müssen {payment_details['balance']} € erstattet werden.",
+            ]
         )
     else:
         outstanding = calculate_ticket_price(order)
         if outstanding != payment_details["balance"]:
-            report += (
-                f"FALSCHER_BETRAG;{reference_code};Bestellung {reference_code} "
-                f"wurde inkorrekt bezahlt. Sollte sein: {outstanding} €. Tatsächlich bezahlt: "
-                f"{payment_details['balance']} €.\n"
+            report.append(
+                [
+                    "FALSCHER_BETRAG",
+                    reference_code,
+                    f"Bestellung {reference_code} wurde inkorrekt bezahlt. Sollte sein: {outstanding} €. "
+                    f"Tatsächlich bezahlt: {payment_details['balance']} €.",
+                ]
             )
             # This should not be stored as paid yet. Just to be sure, we overwrite the values.
             order.is_paid = False
             order.payment_date = None
         else:
-            report += (
-                f"BEZAHLT;{reference_code};Bestellung {reference_code} wurde bezahlt.\n"
+            report.append(
+                ["BEZAHLT", reference_code, f"Bestellung {reference_code} wurde bezahlt."]
             )
             order.is_paid = True
             order.payment_date = payment_details["payment_date"]
-
-    return report
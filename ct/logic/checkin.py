@@ -0,0 +1,86 @@
+from enum import Enum
+
+from django.db import transaction
+from django.utils import timezone
+
+from ct.logic.ticket_token import (
+    get_event_verification_key,
+    is_ticket_token,
+    verify_ticket_token,
+)
+from ct.models.ticket import Ticket
+
+
+class CheckInStatus(Enum):
+    VALID = "valid"
+    UNPAID = "unpaid"
+    CANCELLED = "cancelled"
+    ALREADY_USED = "already_used"
+    UNKNOWN = "unknown"
+
+
+def check_in_tickets(event_id: str, scanned_codes: list) -> list[dict]:
+    # Validates a batch of scanned ticket codes or ticket tokens and marks all valid tickets as used.
+    # Only tickets of paid, non-deleted orders are let in, and each ticket only once across all
+    # entrances.
+    scanned_codes = list(dict.fromkeys(scanned_codes))  # Remove duplicates, keep the order
+    now = timezone.now()
+
+    # Tokens are checked without a query. Tokens with an invalid signature are unknown.
+    verification_key = get_event_verification_key(event_id)
+    ticket_codes_by_scanned_code = {
+        code: verify_ticket_token(code, verification_key) if is_ticket_token(code) else code
+        for code in scanned_codes
+    }
+    ticket_codes = [code for code in ticket_codes_by_scanned_code.values() if code is not None]
+
+    with transaction.atomic():
+        rows = (
+            Ticket.objects.select_for_update(of=("self",))
+            .filter(ticket_code__in=ticket_codes, order__event_id=event_id)
+            .values_list("ticket_code", "checked_in_at", "order__is_paid", "order__is_deleted")
+        )
+        statuses = {}
+        checked_in_dates = {}
+        for ticket_code, checked_in_at, is_paid, is_order_deleted in rows:
+            if is_order_deleted:
+                statuses[ticket_code] = CheckInStatus.CANCELLED
+            elif not is_paid:
+                statuses[ticket_code] = CheckInStatus.UNPAID
+            elif checked_in_at is not None:
+                statuses[ticket_code] = CheckInStatus.ALREADY_USED
+            else:
+                statuses[ticket_code] = CheckInStatus.VALID
+            checked_in_dates[ticket_code] = checked_in_at
+
+        valid_codes = [code for code, status in statuses.items() if status == CheckInStatus.VALID]
+        if valid_codes:
+            # The condition on checked_in_at keeps a ticket from being used twice, even on databases
+            # which ignore the row lock (SQLite)
+            num_checked_in = Ticket.objects.filter(
+                ticket_code__in=valid_codes, checked_in_at__isnull=True
+            ).update(checked_in_at=now)
+
+            if num_checked_in < len(valid_codes):
+                # Another entrance was faster for some of the tickets
+                used_elsewhere = Ticket.objects.filter(ticket_code__in=valid_codes).exclude(
+                    checked_in_at=now
+                )
+                for ticket_code, checked_in_at in used_elsewhere.values_list(
+                    "ticket_code", "checked_in_at"
+                ):
+                    statuses[ticket_code] = CheckInStatus.ALREADY_USED
+                    checked_in_dates[ticket_code] = checked_in_at
+
+            for ticket_code in valid_codes:
+                if statuses[ticket_code] == CheckInStatus.VALID:
+                    checked_in_dates[ticket_code] = now
+
+    return [
+        {
+            "ticket_code": scanned_code,
+            "status": statuses.get(ticket_code, CheckInStatus.UNKNOWN).value,
+            "checked_in_at": checked_in_dates.get(ticket_code),
+        }
+        for scanned_code, ticket_code in ticket_codes_by_scanned_code.items()
+    ]
@@ -1,36 +1,124 @@
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Coalesce, Greatest
+
+from ct.constants import (
+    AVAILABILITY_CACHE_SECONDS,
+    EVENT_INFOS_CACHE_SECONDS,
+    TICKET_PRICE_DISCOUNT,
+    TICKET_PRICE_REGULAR,
+)
+from ct.logic.event_cache import get_event_display
 from ct.models.event import Event
-from ct.models.ticket import Ticket, TicketType
+
+EVENT_INFOS_CACHE_KEY = "event_infos"
+AVAILABILITY_CACHE_KEY = "ticket_availability"
 
 
 def get_remaining_tickets(event_id: str) -> int:
-    event = Event.objects.get(pk=event_id)
-    num_tickets_sold = Ticket.objects.filter(
-        order__event=event, order__is_deleted=False
-    ).count()
-    return max(event.max_number_tickets - num_tickets_sold, 0)
+    max_number_tickets, tickets_reserved = Event.objects.values_list(
+        "max_number_tickets", "tickets_reserved"
+    ).get(pk=event_id)
+    return max(max_number_tickets - tickets_reserved, 0)
+
+
+def reserve_tickets(event_id: str, number_tickets: int) -> bool:
+    # A single conditional UPDATE, which is atomic on PostgreSQL as well as on SQLite. If the
+    # remaining capacity is too small, no row matches and nothing is reserved.
+    num_updated = Event.objects.filter(
+        key=event_id,
+        tickets_reserved__lte=F("max_number_tickets") - number_tickets,
+    ).update(tickets_reserved=F("tickets_reserved") + number_tickets)
+    return num_updated == 1
+
+
+def release_tickets(event_id: str, number_tickets: int) -> None:
+    Event.objects.filter(key=event_id).update(
+        tickets_reserved=Greatest(F("tickets_reserved") - number_tickets, 0)
+    )
+
+
+def get_availability_snapshot() -> list[dict]:
+    # Remaining tickets of all active events, computed with a single query. Used for the order
+    # form, which is the most requested page.
+    snapshot = cache.get(AVAILABILITY_CACHE_KEY)
+    if snapshot is None:
+        snapshot = [get_availability(event) for event in get_active_event_rows()]
+        cache.set(AVAILABILITY_CACHE_KEY, snapshot, AVAILABILITY_CACHE_SECONDS)
+    return snapshot
+
+
+def get_active_event_rows():
+    # Values which are put into the shared cache are always read from the primary. Read from a
+    # lagging replica, they would overwrite a fresh invalidation with outdated numbers.
+    return Event.objects.using(DEFAULT_DB_ALIAS).filter(is_active=True)
+
+
+def get_availability(event: Event) -> dict:
+    return {
+        "key": event.key,
+        "name": get_event_display(event).label,
+        "remaining_tickets": max(event.max_number_tickets - event.tickets_reserved, 0),
+    }
+
+
+def invalidate_availability() -> None:
+    transaction.on_commit(lambda: cache.delete(AVAILABILITY_CACHE_KEY))
 
 
 def get_event_infos():
-    events = Event.objects.filter(is_active=True)
-    event_infos = []
-    for event in events:
-        all_tickets = Ticket.objects.filter(order__event=event)
-        num_discount_tickets = all_tickets.filter(type=TicketType.DISCOUNT.name, order__is_deleted=False).count()
-        num_regular_tickets = all_tickets.filter(type=TicketType.REGULAR.name, order__is_deleted=False).count()
+    event_infos = cache.get(EVENT_INFOS_CACHE_KEY)
+    if event_infos is None:
+        event_infos = calculate_event_infos()
+        cache.set(EVENT_INFOS_CACHE_KEY, event_infos, EVENT_INFOS_CACHE_SECONDS)
+    return event_infos
 
-        num_discount_deleted = all_tickets.filter(type=TicketType.DISCOUNT.name, order__is_deleted=True).count()
-        num_regular_deleted = all_tickets.filter(type=TicketType.REGULAR.name, order__is_deleted=True).count()
 
+def invalidate_event_infos() -> None:
+    # Deferred until the current transaction is committed, so that no other request caches the
+    # statistics from before the change in the meantime.
+    transaction.on_commit(lambda: cache.delete(EVENT_INFOS_CACHE_KEY))
+
+
+def get_event_statistics():
+    # All statistics are aggregated by the database in a single grouped query over the orders,
+    # which is served by the covering index ct_order_event_stats_idx
+    not_deleted = Q(order__is_deleted=False)
+    deleted = Q(order__is_deleted=True)
+    order_price = (
+        F("order__number_discount") * TICKET_PRICE_DISCOUNT
+        + F("order__number_regular") * TICKET_PRICE_REGULAR
+    )
+    return Event.objects.using(DEFAULT_DB_ALIAS).filter(is_active=True).annotate(
+        discount_sold=Coalesce(Sum("order__number_discount", filter=not_deleted), 0),
+        regular_sold=Coalesce(Sum("order__number_regular", filter=not_deleted), 0),
+        discount_deleted=Coalesce(Sum("order__number_discount", filter=deleted), 0),
+        regular_deleted=Coalesce(Sum("order__number_regular", filter=deleted), 0),
+        revenue_paid=Coalesce(
+            Sum(order_price, filter=not_deleted & Q(order__is_paid=True)), 0
+        ),
+        revenue_unpaid=Coalesce(
+            Sum(order_price, filter=not_deleted & Q(order__is_paid=False)), 0
+        ),
+    )
+
+
+def calculate_event_infos():
+    event_infos = []
+    for event in get_event_statistics():
         event_infos.append(
             {
-                "name": str(event),
+                "name": get_event_display(event).label,
                 "max_number_tickets": event.max_number_tickets,
-                "regular_sold": num_regular_tickets,
-                "discount_sold": num_discount_tickets,
-                "regular_deleted": num_regular_deleted,
-                "discount_deleted":num_discount_deleted,
-                "total_sold": num_regular_tickets + num_discount_tickets,
-                "remaining_tickets": get_remaining_tickets(event.key),
+                "regular_sold": event.regular_sold,
+                "discount_sold": event.discount_sold,
+                "regular_deleted": event.regular_deleted,
+                "discount_deleted": event.discount_deleted,
+                "total_sold": event.regular_sold + event.discount_sold,
+                "remaining_tickets": max(event.max_number_tickets - event.tickets_reserved, 0),
+                "revenue_paid": event.revenue_paid,
+                "revenue_unpaid": event.revenue_unpaid,
             }
         )
     return event_infos
@@ -0,0 +1,150 @@
+import json
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+import pytz
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ct.constants import EVENT_CACHE_CHECK_INTERVAL_SECONDS
+from ct.models.event import Event
+
+EVENT_CACHE_VERSION_KEY = "event_cache_version"
+BERLIN_TZ = pytz.timezone("Europe/Berlin")
+
+# English to German weekday translation dictionary
+WEEKDAY_TRANSLATION = {
+    "Monday": "Montag",
+    "Tuesday": "Dienstag",
+    "Wednesday": "Mittwoch",
+    "Thursday": "Donnerstag",
+    "Friday": "Freitag",
+    "Saturday": "Samstag",
+    "Sunday": "Sonntag",
+}
+
+
+class CachedEvent:
+    # Read-only copy of an event, with everything which is displayed on the order page, the
+    # invoices, the tickets and in the emails computed once. The number of reserved tickets is not
+    # cached, it changes with every order.
+    def __init__(self, event: Event):
+        self.key = event.key
+        self.location = event.location
+        self.datetime = event.datetime
+        self.program = event.program
+        self.conductor = event.conductor
+        self.is_active = event.is_active
+        self.fields = get_displayed_fields(event)
+
+        local_datetime = event.datetime.astimezone(BERLIN_TZ)
+        self.program_lines = json.loads(event.program)
+        self.weekday = WEEKDAY_TRANSLATION[local_datetime.strftime("%A")]
+        self.date_str = local_datetime.strftime(r"%d.%m.%Y")
+        self.time_str = local_datetime.strftime(r"%H:%M")
+        self.entrance_time_str = (
+            (event.datetime - timedelta(minutes=30)).astimezone(BERLIN_TZ).strftime(r"%H:%M")
+        )
+        # Same as str(event)
+        self.label = f"{self.date_str}, {self.time_str} Uhr, {self.location}"
+
+    def __str__(self):
+        return self.label
+
+
+def get_displayed_fields(event: Event) -> tuple:
+    return (
+        event.key,
+        event.location,
+        event.datetime,
+        event.program,
+        event.conductor,
+        event.is_active,
+    )
+
+
+# The cache is per process and always loads events from the primary database, so that a lagging
+# replica never puts an outdated event into it. Signals only reach the process which saved the
+# event (usually a web process of the admin), so the other processes compare a version in the
+# shared cache at most every EVENT_CACHE_CHECK_INTERVAL_SECONDS.
+_events = {}
+_active_events = None
+_lock = threading.Lock()
+_version = None
+_version_checked_at = 0.0
+
+
+def clear_local_cache() -> None:
+    global _active_events
+    with _lock:
+        _events.clear()
+        _active_events = None
+
+
+def check_version() -> None:
+    global _version, _version_checked_at
+    if time.monotonic() - _version_checked_at < EVENT_CACHE_CHECK_INTERVAL_SECONDS:
+        return
+    _version_checked_at = time.monotonic()
+    version = cache.get(EVENT_CACHE_VERSION_KEY)
+    if version != _version:
+        clear_local_cache()
+        _version = version
+
+
+def get_cached_event(event_id: str) -> CachedEvent:
+    # Raises Event.DoesNotExist like Event.objects.get
+    check_version()
+    cached = _events.get(event_id)
+    if cached is None:
+        cached = CachedEvent(Event.objects.using(DEFAULT_DB_ALIAS).get(pk=event_id))
+        with _lock:
+            _events[event_id] = cached
+    return cached
+
+
+def get_active_events() -> list[CachedEvent]:
+    global _active_events
+    check_version()
+    active_events = _active_events
+    if active_events is None:
+        active_events = [
+            CachedEvent(event)
+            for event in Event.objects.using(DEFAULT_DB_ALIAS).filter(is_active=True)
+        ]
+        with _lock:
+            _events.update((cached.key, cached) for cached in active_events)
+            _active_events = active_events
+    return active_events
+
+
+def get_event_display(event: Event) -> CachedEvent:
+    # For code which already loaded the event, e.g. with its order. The cached entry is only used if
+    # it was created from the same values, so that a PDF never shows outdated event data.
+    check_version()
+    cached = _events.get(event.key)
+    if cached is not None and cached.fields == get_displayed_fields(event):
+        return cached
+    cached = CachedEvent(event)
+    if event.key not in _events and event._state.db == DEFAULT_DB_ALIAS:
+        with _lock:
+            _events[event.key] = cached
+    return cached
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_event_cache(sender, **kwargs) -> None:
+    # Deferred until the change is committed, so that no request caches the old event in the
+    # meantime
+    def invalidate():
+        global _version
+        _version = uuid.uuid4().hex
+        cache.set(EVENT_CACHE_VERSION_KEY, _version, None)
+        clear_local_cache()
+
+    transaction.on_commit(invalidate)
@@ -0,0 +1,187 @@
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+from io import BytesIO
+
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ct.constants import (
+    FULFILLMENT_LOCK_TIMEOUT_SECONDS,
+    FULFILLMENT_MAX_ATTEMPTS,
+    FULFILLMENT_POLL_INTERVAL_SECONDS,
+    FULFILLMENT_RETRY_BASE_SECONDS,
+    FULFILLMENT_RETRY_MAX_SECONDS,
+)
+from ct.logic.pdf_store import get_or_render_pdf
+from ct.logic.order import send_email_invoice_and_tickets
+from ct.logic.ticket import issue_tickets
+from ct.models.fulfillment import FulfillmentJob, JobState
+from ct.models.order import Order
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_fulfillment(order: Order) -> FulfillmentJob:
+    # Should be called in the same transaction as the order creation, so that every committed
+    # order has a job and no job points to an order which was rolled back.
+    now = timezone.now()
+    return FulfillmentJob.objects.create(
+        order=order, created_date=now, next_attempt_date=now
+    )
+
+
+def claimable_jobs_filter(now) -> Q:
+    # Jobs which are due, and jobs whose worker did not finish them in time (e.g. because it crashed)
+    return Q(state=JobState.PENDING.name, next_attempt_date__lte=now) | Q(
+        state=JobState.RUNNING.name,
+        locked_date__lte=now - timedelta(seconds=FULFILLMENT_LOCK_TIMEOUT_SECONDS),
+    )
+
+
+def claim_next_job(worker_id: str):
+    now = timezone.now()
+    candidates = list(
+        FulfillmentJob.objects.filter(claimable_jobs_filter(now))
+        .order_by("next_attempt_date")
+        .values_list("pk", flat=True)[:10]
+    )
+
+    for pk in candidates:
+        # The conditional UPDATE makes sure that only one worker can claim a job, on PostgreSQL
+        # as well as on SQLite. If another worker was faster, zero rows are updated.
+        claimed = FulfillmentJob.objects.filter(
+            claimable_jobs_filter(now), pk=pk
+        ).update(
+            state=JobState.RUNNING.name,
+            locked_by=worker_id,
+            locked_date=now,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return FulfillmentJob.objects.select_related("order__event").get(pk=pk)
+
+    return None
+
+
+def calculate_retry_delay(attempts: int) -> timedelta:
+    # Exponential backoff: 30s, 60s, 120s, ... capped at one hour
+    delay = FULFILLMENT_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0)
+    return timedelta(seconds=min(delay, FULFILLMENT_RETRY_MAX_SECONDS))
+
+
+def owned_job(job: FulfillmentJob):
+    # The job as long as it is still locked by the worker which claimed it. Once the lock timed out
+    # and another worker (or a later claim) took the job over, this is empty.
+    return FulfillmentJob.objects.filter(
+        pk=job.pk,
+        state=JobState.RUNNING.name,
+        locked_by=job.locked_by,
+        locked_date=job.locked_date,
+    )
+
+
+def finish_job(job: FulfillmentJob, **fields) -> bool:
+    # Drops the result if the job was taken over in the meantime, so that the original worker does
+    # not overwrite the state of the new one
+    if owned_job(job).update(locked_by="", locked_date=None, **fields):
+        return True
+    logger.warning(
+        "Fulfillment job of order %s was taken over by another worker, dropping the result",
+        job.order_id,
+    )
+    return False
+
+
+def process_job(job: FulfillmentJob) -> None:
+    order = job.order
+    try:
+        # Tickets are issued together with the order, so a retry renders the same tickets again
+        tickets = list(order.ticket_set.all())
+        if not tickets:
+            # Orders which were created before tickets were issued at order creation
+            tickets = issue_tickets(order)
+
+        # A retry after a failed email sends the stored PDF instead of rendering it again
+        pdf = BytesIO(get_or_render_pdf(order, tickets))
+        # Rendering may take longer than the lock timeout. A worker which lost the job does not
+        # send the email, the new owner sends it.
+        if not owned_job(job).exists():
+            logger.warning(
+                "Fulfillment job of order %s was taken over by another worker, not sending it",
+                order.reference_code,
+            )
+            return
+        send_email_invoice_and_tickets(order, pdf)
+    except Exception as e:
+        logger.exception("Fulfillment of order %s failed", order.reference_code)
+        if job.attempts >= FULFILLMENT_MAX_ATTEMPTS:
+            finish_job(
+                job,
+                state=JobState.FAILED.name,
+                finished_date=timezone.now(),
+                last_error=repr(e),
+            )
+        else:
+            finish_job(
+                job,
+                state=JobState.PENDING.name,
+                next_attempt_date=timezone.now() + calculate_retry_delay(job.attempts),
+                last_error=repr(e),
+            )
+        return
+
+    finish_job(job, state=JobState.DONE.name, finished_date=timezone.now(), last_error="")
+
+
+def process_job_in_thread(job: FulfillmentJob) -> None:
+    try:
+        process_job(job)
+    finally:
+        close_old_connections()
+
+
+def run_worker(worker_id: str, once: bool = False, concurrency: int = 1) -> int:
+    # Process jobs until the queue is empty (once=True) or forever. Returns the number of processed jobs.
+    if concurrency > 1:
+        return run_concurrent_worker(worker_id, once, concurrency)
+
+    num_processed = 0
+    while True:
+        close_old_connections()
+        job = claim_next_job(worker_id)
+
+        if job is None:
+            if once:
+                return num_processed
+            time.sleep(FULFILLMENT_POLL_INTERVAL_SECONDS)
+            continue
+
+        process_job(job)
+        num_processed += 1
+
+
+def run_concurrent_worker(worker_id: str, once: bool, concurrency: int) -> int:
+    # Keeps several jobs in flight. The PDFs are rendered by the render pool and the emails are sent
+    # while other jobs are rendered, so that one worker process can use several cores.
+    num_processed = 0
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            close_old_connections()
+            while len(in_flight) < concurrency:
+                job = claim_next_job(worker_id)
+                if job is None:
+                    break
+                in_flight.add(executor.submit(process_job_in_thread, job))
+
+            if not in_flight:
+                if once:
+                    return num_processed
+                time.sleep(FULFILLMENT_POLL_INTERVAL_SECONDS)
+                continue
+
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            num_processed += len(done)
@@ -1,5 +1,4 @@
 from io import BytesIO
-from pathlib import Path
 
 from reportlab.lib.pagesizes import A4
 from reportlab.platypus import (
@@ -18,12 +17,15 @@ from reportlab.platypus.flowables import Flowable, HRFlowable
 from ct.constants import (FOOTER_INVOICE, HEADER_INVOICE, IBAN,
                            NAME_ORCHESTRA_FULL, PAYMENT_GRACE_PERIOD_DAYS,
                            TICKET_PRICE_DISCOUNT, TICKET_PRICE_REGULAR)
+from ct.logic.assets import draw_image
+from ct.logic.event_cache import get_event_display
+from ct.logic.metrics import timed
 from ct.logic.order import calculate_ticket_price
 from ct.logic.styles import (STYLE_HEADING, STYLE_IMPORTANT, STYLE_NORMAL,
                               STYLE_SMALL, STYLE_SMALL_CENTERED)
-from ct.logic.ticket import TicketFlowable, create_ticket
+from ct.logic.ticket import TicketFlowable
 from ct.models.order import Order
-from ct.models.ticket import TicketType
+from ct.models.ticket import Ticket, TicketType
 
 HEADER_HEIGHT = 110
 FOOTER_HEIGHT = 80
@@ -31,9 +33,9 @@ FRAME_SPACE = 12
 
 
 class PositionedImage(Flowable):
-    def __init__(self, image_path, x, y, width, height, hAlign="LEFT"):
+    def __init__(self, image_name, x, y, width, height, hAlign="LEFT"):
         Flowable.__init__(self)
-        self.image_path = image_path
+        self.image_name = image_name
         self.x = x
         self.y = y
         self.width = width
@@ -41,34 +43,43 @@ class PositionedImage(Flowable):
         self.hAlign = hAlign
 
     def draw(self):
-        self.canv.drawImage(
-            self.image_path, self.x, self.y, width=self.width, height=self.height
+        draw_image(
+            self.canv, self.image_name, self.x, self.y, width=self.width, height=self.height
         )
 
 
-# Create a PDF for a single order
-def create_invoice_and_tickets(order: Order) -> BytesIO:
+INVOICE_FORM_NAME = "invoice_static_layer"
+
+
+# Create a PDF for a single order and its already issued tickets. With use_templates, the parts
+# which are the same for every order (invoice header and footer, static parts of the tickets) are
+# drawn once per PDF as form XObjects instead of being laid out on every page.
+@timed("create_invoice_and_tickets")
+def create_invoice_and_tickets(
+    order: Order, tickets: list[Ticket], use_templates: bool = True
+) -> BytesIO:
     pdf_buffer = BytesIO()
 
     doc = BaseDocTemplate(pdf_buffer, pagesize=A4, showBoundary=0)
 
-    setup_page_templates(doc)
+    setup_page_templates(doc, use_templates)
 
     story = []
 
-    generate_invoice_page(story, order)
+    generate_invoice_page(story, order, use_templates)
 
     story.append(NextPageTemplate("tickets"))
     story.append(PageBreak())
 
-    generate_ticket_page(doc, story, order)
+    generate_ticket_page(doc, story, order, tickets, use_templates)
 
-    doc.build(story)
+    with timed("doc_build"):
+        doc.build(story)
     pdf_buffer.seek(0)  # Reset buffer position to the beginning
     return pdf_buffer
 
 
-def setup_page_templates(doc: BaseDocTemplate):
+def create_invoice_frames(doc: BaseDocTemplate):
     # Define a two-column header layout
     header_left = Frame(
         doc.leftMargin,
@@ -102,6 +113,12 @@ def setup_page_templates(doc: BaseDocTemplate):
         id="footer",
     )
 
+    return header_left, header_right, main_content, footer
+
+
+def setup_page_templates(doc: BaseDocTemplate, use_templates: bool = True):
+    header_left, header_right, main_content, footer = create_invoice_frames(doc)
+
     full_page = Frame(
         doc.leftMargin,
         doc.bottomMargin,
@@ -112,25 +129,57 @@ def setup_page_templates(doc: BaseDocTemplate):
 
     full_page_template = PageTemplate(id="tickets", frames=[full_page])
 
-    invoice_template = PageTemplate(
-        id="invoice", frames=[header_left, header_right, main_content, footer]
-    )
+    if use_templates:
+        # Header and footer are drawn by draw_invoice_static_layer
+        invoice_template = PageTemplate(
+            id="invoice", frames=[main_content], onPage=draw_invoice_static_layer
+        )
+    else:
+        invoice_template = PageTemplate(
+            id="invoice", frames=[header_left, header_right, main_content, footer]
+        )
 
     doc.addPageTemplates([invoice_template, full_page_template])
 
 
-def generate_invoice_page(story, order):
-    add_to_story(story, HEADER_INVOICE, STYLE_SMALL)
+def draw_invoice_static_layer(canvas, doc):
+    if not canvas.hasForm(INVOICE_FORM_NAME):
+        header_left, header_right, _, footer = create_invoice_frames(doc)
+        canvas.beginForm(INVOICE_FORM_NAME)
+        header_left.addFromList(create_invoice_header(), canvas)
+        header_right.addFromList([create_invoice_logo()], canvas)
+        footer.addFromList(create_invoice_footer(), canvas)
+        canvas.endForm()
+    canvas.doForm(INVOICE_FORM_NAME)
+
+
+def create_invoice_header() -> list:
+    header = []
+    add_to_story(header, HEADER_INVOICE, STYLE_SMALL)
+    return header
+
 
-    logo = PositionedImage(
-        Path(__file__).parent.parent / "static" / "ct" / "logo.png",
+def create_invoice_logo() -> Flowable:
+    return PositionedImage(
+        "logo.png",
         x=-20,
         y=0,
         width=129,
         height=95,
         hAlign="RIGHT",
     )
-    story.append(logo)
+
+
+def create_invoice_footer() -> list:
+    footer = []
+    add_to_story(footer, FOOTER_INVOICE, STYLE_SMALL_CENTERED)
+    return footer
+
+
+def generate_invoice_page(story, order, use_templates=True):
+    if not use_templates:
+        story.extend(create_invoice_header())
+        story.append(create_invoice_logo())
 
     add_to_story(story, "Rechnung", STYLE_HEADING)
     add_to_story(
@@ -148,7 +197,7 @@ def generate_invoice_page(story, order):
         story,
         [
             f"Leistung: Semesterkonzert der {NAME_ORCHESTRA_FULL}",
-            str(order.event),
+            get_event_display(order.event).label,
         ],
     )
 
@@ -225,9 +274,9 @@ def generate_invoice_page(story, order):
         ],
     )
 
-    story.append(FrameBreak())
-
-    add_to_story(story, FOOTER_INVOICE, STYLE_SMALL_CENTERED)
+    if not use_templates:
+        story.append(FrameBreak())
+        story.extend(create_invoice_footer())
 
 
 def add_to_story(story, lines, style=STYLE_NORMAL):
@@ -242,26 +291,15 @@ def add_space(story, height=12):
     story.append(Spacer(1, height))
 
 
-def generate_ticket_page(doc, story, order):
+def generate_ticket_page(doc, story, order, tickets, use_templates=True):
     add_to_story(story, "Ihre Tickets", STYLE_HEADING)
 
     # First print discounted tickets, then regular tickets.
-    for i in range(order.number_discount):
-        ticket = create_ticket(order, TicketType.DISCOUNT)
-        add_to_story(
-            story,
-            "Die Tickets können entweder ausgedruckt oder digital vorgezeigt werden.",
-        )
-        add_space(story)
-        story.append(TicketFlowable(order, doc.width, ticket))
-        story.append(PageBreak())
-
-    for i in range(order.number_regular):
-        ticket = create_ticket(order, TicketType.REGULAR)
+    for ticket in sorted(tickets, key=lambda t: t.type != TicketType.DISCOUNT.name):
         add_to_story(
             story,
             "Die Tickets können entweder ausgedruckt oder digital vorgezeigt werden.",
         )
         add_space(story)
-        story.append(TicketFlowable(order, doc.width, ticket))
+        story.append(TicketFlowable(order, doc.width, ticket, use_templates))
         story.append(PageBreak())
@@ -0,0 +1,203 @@
+import logging
+import os
+import queue
+import smtplib
+import threading
+import time
+from email.message import Message
+
+from ct.constants import (
+    EMAIL_MAX_MESSAGES_PER_CONNECTION,
+    EMAIL_PASSWORD,
+    EMAIL_POOL_IDLE_TIMEOUT_SECONDS,
+    EMAIL_POOL_SIZE,
+    EMAIL_PORT,
+    EMAIL_SERVER,
+    EMAIL_TIMEOUT_SECONDS,
+    SENDER_EMAIL,
+)
+from ct.logic.metrics import EMAIL_DURATION, EMAILS
+
+logger = logging.getLogger(__name__)
+
+
+class PooledConnection:
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.num_messages = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPConnectionPool:
+    # Keeps authenticated SMTP sessions open, so that STARTTLS and login only happen once per
+    # connection instead of once per message.
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        user: str,
+        password: str,
+        max_size: int = EMAIL_POOL_SIZE,
+        max_messages_per_connection: int = EMAIL_MAX_MESSAGES_PER_CONNECTION,
+        idle_timeout: float = EMAIL_POOL_IDLE_TIMEOUT_SECONDS,
+    ):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.max_messages_per_connection = max_messages_per_connection
+        self.idle_timeout = idle_timeout
+        self.idle_connections = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.pid = os.getpid()
+
+    def connect(self) -> PooledConnection:
+        with EMAIL_DURATION.time(step="connect"):
+            smtp = smtplib.SMTP(self.host, self.port, timeout=EMAIL_TIMEOUT_SECONDS)
+            smtp.starttls()
+        with EMAIL_DURATION.time(step="login"):
+            smtp.login(self.user, self.password)
+        return PooledConnection(smtp)
+
+    def acquire(self) -> PooledConnection:
+        self.slots.acquire()
+        try:
+            return self.get_idle_connection() or self.connect()
+        except Exception:
+            self.slots.release()
+            raise
+
+    def get_idle_connection(self):
+        # Returns a usable idle connection, or None if there is none
+        while True:
+            try:
+                connection = self.idle_connections.get_nowait()
+            except queue.Empty:
+                return None
+
+            if self.is_usable(connection):
+                return connection
+            self.close_connection(connection)
+
+    def release(self, connection: PooledConnection = None, broken: bool = False) -> None:
+        if connection is not None:
+            connection.last_used = time.monotonic()
+            if (
+                broken
+                or connection.num_messages >= self.max_messages_per_connection
+                or os.getpid() != self.pid
+            ):
+                self.close_connection(connection)
+            else:
+                self.idle_connections.put(connection)
+        self.slots.release()
+
+    def is_usable(self, connection: PooledConnection) -> bool:
+        # Servers close idle sessions after a while. Only check connections which were idle for some
+        # time, so that a batch does not pay an additional round trip per message.
+        if time.monotonic() - connection.last_used < self.idle_timeout:
+            return True
+        try:
+            return connection.smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def close_connection(self, connection: PooledConnection) -> None:
+        try:
+            connection.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            connection.smtp.close()
+
+    def close_all(self) -> None:
+        while True:
+            try:
+                connection = self.idle_connections.get_nowait()
+            except queue.Empty:
+                return
+            self.close_connection(connection)
+
+    def send_on_connection(
+        self, connection: PooledConnection, msg: Message, recipients: list
+    ) -> PooledConnection:
+        # Sends a message and transparently reconnects once if the server dropped the session.
+        # Returns the connection which should be used for the next message.
+        try:
+            with EMAIL_DURATION.time(step="send"):
+                connection.smtp.sendmail(self.user, recipients, msg.as_string())
+        except (smtplib.SMTPServerDisconnected, OSError):
+            self.close_connection(connection)
+            connection = self.connect()
+            try:
+                with EMAIL_DURATION.time(step="send"):
+                    connection.smtp.sendmail(self.user, recipients, msg.as_string())
+            except Exception:
+                self.close_connection(connection)
+                raise
+        connection.num_messages += 1
+        EMAILS.inc(result="sent")
+        return connection
+
+    def send_message(self, msg: Message, recipients: list) -> None:
+        connection = self.acquire()
+        try:
+            connection = self.send_on_connection(connection, msg, recipients)
+        except Exception:
+            EMAILS.inc(result="failed")
+            self.release(connection, broken=True)
+            raise
+        self.release(connection)
+
+    def send_messages(self, messages: list, before_send=None) -> list:
+        # Sends a batch of (message, recipients) tuples over as few sessions as possible. Returns a
+        # list of booleans, which indicates for each message whether it was sent successfully.
+        # before_send is called right before each message is sent, e.g. to limit the rate.
+        results = []
+        # Only the slot is taken up front. A connection is opened for the first message, so that a
+        # failed connect or login is recorded for that message like any other error.
+        self.slots.acquire()
+        connection = None
+        try:
+            connection = self.get_idle_connection()
+            for msg, recipients in messages:
+                if before_send is not None:
+                    before_send()
+                try:
+                    if connection is None:
+                        connection = self.connect()
+                    elif connection.num_messages >= self.max_messages_per_connection:
+                        self.close_connection(connection)
+                        connection = None
+                        connection = self.connect()
+                    connection = self.send_on_connection(connection, msg, recipients)
+                    results.append(True)
+                except smtplib.SMTPRecipientsRefused:
+                    # The session is still fine, only this recipient was rejected
+                    logger.exception("Sending email '%s' failed", msg["Subject"])
+                    EMAILS.inc(result="failed")
+                    results.append(False)
+                except (smtplib.SMTPException, OSError):
+                    logger.exception("Sending email '%s' failed", msg["Subject"])
+                    EMAILS.inc(result="failed")
+                    results.append(False)
+                    if connection is not None:
+                        self.close_connection(connection)
+                    connection = None
+        finally:
+            self.release(connection)
+        return results
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_mail_pool() -> SMTPConnectionPool:
+    global _pool
+    with _pool_lock:
+        # A pool inherited from the parent process must not be used in a forked worker
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = SMTPConnectionPool(
+                EMAIL_SERVER, EMAIL_PORT, SENDER_EMAIL, EMAIL_PASSWORD
+            )
+        return _pool
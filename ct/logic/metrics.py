@@ -0,0 +1,214 @@
+import bisect
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+
+from ct.constants import METRICS_CACHE_SECONDS, METRICS_FLUSH_INTERVAL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+METRICS_PROCESSES_CACHE_KEY = "metrics_processes"
+
+
+class Metric:
+    # Base class of all metrics. Values are stored per combination of label values.
+    type = ""
+
+    def __init__(self, name: str, description: str, labels: tuple = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+        REGISTRY[name] = self
+
+    def label_values(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {key: self.copy_value(value) for key, value in self.values.items()}
+
+    def copy_value(self, value):
+        return value
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self.label_values(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        maybe_flush()
+
+    def merge(self, total, value):
+        return (total or 0) + value
+
+    def render(self, key: tuple, value) -> list:
+        return [f"{self.name}{format_labels(self.labels, key)} {value}"]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, description: str, labels: tuple = (), buckets=DURATION_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels) -> None:
+        key = self.label_values(labels)
+        with self.lock:
+            # Count per bucket, sum and total count
+            state = self.values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+        maybe_flush()
+
+    @contextmanager
+    def time(self, **labels):
+        # Usable as context manager and as decorator. Failed calls are measured, too.
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def copy_value(self, value):
+        return [list(value[0]), value[1], value[2]]
+
+    def merge(self, total, value):
+        if total is None:
+            return self.copy_value(value)
+        return [
+            [a + b for a, b in zip(total[0], value[0])],
+            total[1] + value[1],
+            total[2] + value[2],
+        ]
+
+    def render(self, key: tuple, value) -> list:
+        lines = []
+        cumulative = 0
+        for bucket, count in zip(self.buckets, value[0]):
+            cumulative += count
+            labels = format_labels(self.labels + ("le",), key + (str(bucket),))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = format_labels(self.labels + ("le",), key + ("+Inf",))
+        lines.append(f"{self.name}_bucket{labels} {value[2]}")
+        lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {value[1]}")
+        lines.append(f"{self.name}_count{format_labels(self.labels, key)} {value[2]}")
+        return lines
+
+
+def format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+REGISTRY = {}
+
+STAGE_DURATION = Histogram(
+    "ct_stage_duration_seconds", "Duration of the processing stages.", labels=("stage",)
+)
+EMAIL_DURATION = Histogram(
+    "ct_email_duration_seconds",
+    "Duration of connecting, logging in and sending to the SMTP server.",
+    labels=("step",),
+)
+EMAILS = Counter("ct_emails_total", "Sent emails by result.", labels=("result",))
+VIEW_DURATION = Histogram(
+    "ct_view_duration_seconds", "Duration of requests by view.", labels=("view", "method")
+)
+VIEW_REQUESTS = Counter(
+    "ct_view_requests_total", "Requests by view and status code.", labels=("view", "status")
+)
+VIEW_DB_QUERIES = Histogram(
+    "ct_view_db_queries",
+    "Database queries per request by view.",
+    labels=("view",),
+    buckets=QUERY_COUNT_BUCKETS,
+)
+VIEW_DB_DURATION = Histogram(
+    "ct_view_db_duration_seconds", "Time spent in database queries per request.", labels=("view",)
+)
+
+
+def timed(stage: str):
+    return STAGE_DURATION.time(stage=stage)
+
+
+# The metrics are collected per process. Every process regularly writes its values to the shared
+# cache, so that the endpoint can report the sum over all web and worker processes.
+_process_key = None
+_last_flush = 0.0
+_flush_lock = threading.Lock()
+
+
+def get_process_key() -> str:
+    global _process_key
+    if _process_key is None or not _process_key.endswith(f"-{os.getpid()}"):
+        _process_key = f"metrics-{socket.gethostname()}-{os.getpid()}"
+    return _process_key
+
+
+def maybe_flush() -> None:
+    if time.monotonic() - _last_flush >= METRICS_FLUSH_INTERVAL_SECONDS:
+        flush()
+
+
+def flush() -> None:
+    global _last_flush
+    # Only one thread flushes, the others continue without waiting
+    if not _flush_lock.acquire(blocking=False):
+        return
+    try:
+        _last_flush = time.monotonic()
+        key = get_process_key()
+        cache.set(
+            key,
+            {name: metric.snapshot() for name, metric in REGISTRY.items()},
+            METRICS_CACHE_SECONDS,
+        )
+        processes = cache.get(METRICS_PROCESSES_CACHE_KEY, [])
+        if key not in processes:
+            cache.set(METRICS_PROCESSES_CACHE_KEY, processes + [key], METRICS_CACHE_SECONDS)
+    except Exception:
+        # Metrics must never break a request or a job
+        logger.exception("Flushing metrics failed")
+    finally:
+        _flush_lock.release()
+
+
+def render_metrics() -> str:
+    flush()
+    processes = cache.get(METRICS_PROCESSES_CACHE_KEY, [])
+    snapshots = cache.get_many(processes)
+    if len(snapshots) < len(processes):
+        # Forget processes which did not report for a long time
+        cache.set(METRICS_PROCESSES_CACHE_KEY, list(snapshots), METRICS_CACHE_SECONDS)
+
+    lines = []
+    for name, metric in REGISTRY.items():
+        totals = {}
+        for snapshot in snapshots.values():
+            for key, value in snapshot.get(name, {}).items():
+                totals[key] = metric.merge(totals.get(key), value)
+
+        lines.append(f"# HELP {name} {metric.description}")
+        lines.append(f"# TYPE {name} {metric.type}")
+        for key in sorted(totals):
+            lines.extend(metric.render(key, totals[key]))
+    return "\n".join(lines) + "\n"
@@ -1,7 +1,8 @@
-import uuid
-from datetime import datetime, timedelta
+import secrets
+from datetime import timedelta
 from io import BytesIO
 
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 
 from ct.constants import (
@@ -17,12 +18,26 @@ from ct.constants import (
     TICKET_PRICE_REGULAR,
     TICKET_SALE_CLOSE_BEFORE_CONCERT_HOURS,
 )
-from ct.logic.event import get_remaining_tickets
-from ct.logic.shared import datetime_as_german_date_str, send_email
-from ct.models.event import Event
+from ct.logic.event import (
+    get_remaining_tickets,
+    invalidate_availability,
+    invalidate_event_infos,
+    release_tickets,
+    reserve_tickets,
+)
+from ct.logic.event_cache import get_cached_event, get_event_display
+from ct.logic.metrics import timed
+from ct.logic.pdf_store import purge_order_pdfs
+from ct.logic.shared import send_email
+from ct.logic.ticket import issue_tickets
 from ct.models.order import Order
 
+REFERENCE_CODE_ALPHABET = "123456789ABCDEF"
+REFERENCE_CODE_LENGTH = 8
+ORDER_CREATE_MAX_ATTEMPTS = 5
+
 
+@timed("create_order")
 def create_order(
     name: str,
     address: str,
@@ -31,9 +46,7 @@ def create_order(
     number_discount: int,
     number_regular: int,
 ) -> Order:
-    reference_code = generate_random_reference_code()
-    delete_code = generate_random_delete_code()
-    event = Event.objects.get(key=event_id)
+    event = get_cached_event(event_id)
 
     if event.datetime - timezone.now() <= timedelta(
         hours=TICKET_SALE_CLOSE_BEFORE_CONCERT_HOURS
@@ -43,58 +56,92 @@ def create_order(
             "vor Konzertbeginn möglich. Bitte versuchen Sie es über die Abendkasse."
         )
 
-    remaining_tickets = get_remaining_tickets(event_id)
-
-    if remaining_tickets < number_discount + number_regular:
-        raise RuntimeError(
-            f"Es sind nur noch {remaining_tickets} Tickets für dieses Konzert verfügbar."
+    # The reservation is rolled back together with the order if saving the order fails
+    with transaction.atomic():
+        if not reserve_tickets(event_id, number_discount + number_regular):
+            raise RuntimeError(
+                f"Es sind nur noch {get_remaining_tickets(event_id)} Tickets für dieses Konzert verfügbar."
+            )
+
+        new_order = Order(
+            name=name,
+            order_date=timezone.now(),
+            address=address,
+            email=email,
+            event_id=event.key,
+            number_discount=number_discount,
+            number_regular=number_regular,
+            delete_code=generate_random_delete_code(),
         )
-
-    new_order = Order(
-        name=name,
-        order_date=timezone.now(),
-        address=address,
-        reference_code=reference_code,
-        email=email,
-        event=event,
-        number_discount=number_discount,
-        number_regular=number_regular,
-        delete_code=delete_code,
-    )
-    new_order.save()
+        save_with_unique_reference_code(new_order)
+        issue_tickets(new_order)
+        invalidate_event_infos()
+        invalidate_availability()
 
     return new_order
 
 
+def save_with_unique_reference_code(order: Order) -> None:
+    # The primary key constraint guards against duplicate reference codes instead of checking every
+    # code with a separate query. On a collision, the INSERT is retried with a new code.
+    for attempt in range(ORDER_CREATE_MAX_ATTEMPTS):
+        order.reference_code = generate_random_reference_code()
+        try:
+            with transaction.atomic():
+                order.save(force_insert=True)
+            return
+        except IntegrityError:
+            if attempt == ORDER_CREATE_MAX_ATTEMPTS - 1:
+                raise
+
+
 def generate_random_reference_code() -> str:
     """
     Generates a 8-digit, hexadecimal "reference code", which is used for order payments.
-    Codes including "O"s and Zeros are skipped, as they are easily mixed up.
+    Zeros are left out, as they are easily mixed up with "O"s.
 
     :return: The reference code as string
     """
-    while True:
-        code = uuid.uuid4().hex[:8].upper()
-        if "O" not in code and "0" not in code:
-            if not Order.objects.filter(reference_code=code).exists():
-                return code
+    return "".join(secrets.choice(REFERENCE_CODE_ALPHABET) for _ in range(REFERENCE_CODE_LENGTH))
 
 
 def generate_random_delete_code() -> str:
-    return uuid.uuid4().hex[:20]
+    return secrets.token_hex(10)
 
 
-def can_order_be_deleted(reference_code: str) -> bool:
-    order = Order.objects.get(pk=reference_code)
+def can_order_be_deleted(order: Order) -> bool:
     now_date = timezone.now()
     return (order.event.datetime - now_date) >= timedelta(
         days=DELETE_ORDER_DAYS_BEFORE_CONCERT
     )
 
 
-def is_order_deleted(reference_code: str) -> bool:
-    order = Order.objects.get(pk=reference_code)
-    return order.is_deleted
+def cancel_order(order: Order) -> bool:
+    # Marks the order as deleted and releases its tickets. Only the call which actually marks the
+    # order releases them, so that concurrent cancellations cannot release the tickets twice.
+    # Returns False if the order was already cancelled.
+    now = timezone.now()
+    num_deleted = Order.objects.filter(pk=order.pk, is_deleted=False).update(
+        is_deleted=True, delete_date=now, last_modified=now
+    )
+    if num_deleted == 0:
+        return False
+    release_tickets(order.event_id, order.number_discount + order.number_regular)
+    return True
+
+
+def remove_orders(orders: list[Order]) -> None:
+    # Removes orders from the database (e.g. in the admin). The tickets of orders which were not
+    # cancelled before are released.
+    reference_codes = [order.reference_code for order in orders]
+    with transaction.atomic():
+        for order in orders:
+            cancel_order(order)
+            order.delete()
+        invalidate_event_infos()
+        invalidate_availability()
+    for reference_code in reference_codes:
+        purge_order_pdfs(reference_code)
 
 
 def delete_order(reference_code: str, delete_code: str):
@@ -105,9 +152,12 @@ def delete_order(reference_code: str, delete_code: str):
             f"Link zum Löschen der Bestellung ungültig. Bitte kontaktieren Sie {SENDER_EMAIL}."
         )
 
-    order.is_deleted = True
-    order.delete_date = datetime.utcnow()
-    order.save()
+    with transaction.atomic():
+        if not cancel_order(order):
+            raise RuntimeError("Die Bestellung wurde bereits storniert.")
+        invalidate_event_infos()
+        invalidate_availability()
+    purge_order_pdfs(reference_code)
 
     # Send email confirmation
     subject = f"{NAME_ORCHESTRA} - Stornierungsbestätigung {order.reference_code}"
@@ -150,7 +200,7 @@ def send_email_invoice_and_tickets(order: Order, pdf_buffer: BytesIO) -> None:
     email_body = f"""
 Liebe*r {order.name},
 
-herzlichen Dank für Ihre Bestellung von {f"{num_tickets} Tickets" if num_tickets > 1 else "einem Ticket"} für das Konzert am {datetime_as_german_date_str(order.event.datetime)} bei der {NAME_ORCHESTRA}! Anbei finden Sie die Rechnung und {"Ihre Tickets" if num_tickets > 1 else "Ihr Ticket"} als PDF-Datei. Sie können {"die Tickets" if num_tickets > 1 else "das Ticket"} entweder ausdrucken oder auf Ihrem Smartphone vorzeigen. 
+herzlichen Dank für Ihre Bestellung von {f"{num_tickets} Tickets" if num_tickets > 1 else "einem Ticket"} für das Konzert am {get_event_display(order.event).date_str} bei der {NAME_ORCHESTRA}! Anbei finden Sie die Rechnung und {"Ihre Tickets" if num_tickets > 1 else "Ihr Ticket"} als PDF-Datei. Sie können {"die Tickets" if num_tickets > 1 else "das Ticket"} entweder ausdrucken oder auf Ihrem Smartphone vorzeigen. 
 
 Bitte überweisen Sie den Gesamtbetrag von {total_ticket_price} € innerhalb der nächsten {PAYMENT_GRACE_PERIOD_DAYS} Tage auf folgendes Konto:
 
@@ -1,6 +1,11 @@
+import logging
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import timedelta
 
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
 from django.utils import timezone
 
 from ct.constants import (
@@ -10,51 +15,200 @@ from ct.constants import (
     NAME_ORCHESTRA,
     NAME_ORCHESTRA_FULL,
     PAYMENT_GRACE_PERIOD_DAYS,
+    REMINDER_BATCH_SIZE,
+    REMINDER_MAX_EMAILS_PER_MINUTE,
+    REMINDER_MAX_WORKERS,
+    REMINDER_RUN_HEARTBEAT_SECONDS,
+    REMINDER_RUN_STALE_SECONDS,
     SENDER_EMAIL,
     WARNING_GRACE_PERIOD_DAYS,
 )
+from ct.logic.event_cache import get_event_display
 from ct.logic.order import calculate_ticket_price
-from ct.logic.shared import datetime_as_german_date_str, send_email
+from ct.logic.shared import build_email, datetime_as_german_date_str, send_emails
 from ct.models.order import Order
+from ct.models.reminder_run import ReminderKind, ReminderRun, ReminderRunState
 
+logger = logging.getLogger(__name__)
 
-def send_payment_reminder():
-    send_first_reminders()
-    send_first_warnings()
 
+class RateLimiter:
+    # Spaces out emails evenly, shared by all worker threads of the process
+    def __init__(self, max_per_minute: int):
+        self.interval = 60 / max_per_minute
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
 
-def send_first_reminders():
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        time.sleep(max(slot - now, 0))
+
+
+# Shared by all runs, so that the number of threads and the email rate stay bounded even if
+# several runs are started
+executor = ThreadPoolExecutor(max_workers=REMINDER_MAX_WORKERS, thread_name_prefix="reminder")
+rate_limiter = RateLimiter(REMINDER_MAX_EMAILS_PER_MINUTE)
+
+
+def send_payment_reminder() -> list[ReminderRun]:
+    # Starts sending reminders and warnings in the background. Returns the started runs.
+    runs = [
+        start_run(ReminderKind.REMINDER, get_first_reminder_orders()),
+        start_run(ReminderKind.WARNING, get_first_warning_orders()),
+    ]
+    return [run for run in runs if run is not None]
+
+
+def get_first_reminder_orders():
     # Calculate the cutoff date before which orders should be paid by now. We add additional days to the grace
     # period to account for transfer time
     before_grace_period_first_reminder = timezone.now() - timedelta(
         days=PAYMENT_GRACE_PERIOD_DAYS + BANK_TRANSFER_TIME_DAYS
     )
 
-    # Query for orders who need to be reminded
-    first_reminder_orders = list(
-        Order.objects.filter(
-            order_date__lte=before_grace_period_first_reminder,
-            is_paid=False,
-            is_deleted=False,
-            reminder_sent=False,
-            warning_sent=False,  # This should not occur if reminder_sent is False
-        )
+    # Query for orders who need to be reminded. Served by the partial index ct_order_reminder_idx.
+    return Order.objects.filter(
+        order_date__lte=before_grace_period_first_reminder,
+        is_paid=False,
+        is_deleted=False,
+        reminder_sent=False,
+        warning_sent=False,  # This should not occur if reminder_sent is False
+    ).select_related("event")
+
+
+def get_first_warning_orders():
+    before_grace_period_first_warning = timezone.now() - timedelta(
+        days=WARNING_GRACE_PERIOD_DAYS + BANK_TRANSFER_TIME_DAYS
     )
-    background_thread = threading.Thread(
-        target=send_first_reminder_emails(first_reminder_orders)
+
+    # Served by the partial index ct_order_warning_idx
+    return Order.objects.filter(
+        is_paid=False,
+        is_deleted=False,
+        reminder_sent=True,
+        reminder_date__lte=before_grace_period_first_warning,
+        warning_sent=False,
+    ).select_related("event")
+
+
+def start_run(kind: ReminderKind, orders):
+    now = timezone.now()
+    fail_stale_runs(kind, now)
+
+    # Only one run per kind can be running (constraint ct_reminderrun_one_running), as a second run
+    # would send the same emails again
+    try:
+        with transaction.atomic():
+            run = ReminderRun.objects.create(
+                kind=kind.name, started_date=now, heartbeat_date=now
+            )
+    except IntegrityError:
+        return None
+
+    try:
+        orders = list(orders)
+    except Exception as e:
+        finish_run(run, ReminderRunState.FAILED, repr(e))
+        raise
+    run.num_total = len(orders)
+    run.save(update_fields=["num_total"])
+    threading.Thread(target=dispatch_run, args=(run, kind, orders)).start()
+    return run
+
+
+def fail_stale_runs(kind: ReminderKind, now) -> None:
+    # Runs of a process which died are never finished and would block all later runs
+    stale_date = now - timedelta(seconds=REMINDER_RUN_STALE_SECONDS)
+    ReminderRun.objects.filter(
+        kind=kind.name, state=ReminderRunState.RUNNING.name, heartbeat_date__lt=stale_date
+    ).update(
+        state=ReminderRunState.FAILED.name,
+        finished_date=now,
+        last_error="Abgebrochen (keine Rückmeldung)",
     )
-    background_thread.start()
 
 
-def send_first_reminder_emails(unpaid_orders: list[Order]):
-    for order in unpaid_orders:
-        subject = f"Zahlungserinnerung {NAME_ORCHESTRA} {order.reference_code}"
+def finish_run(run: ReminderRun, state: ReminderRunState, last_error: str = "") -> None:
+    # Conditional, so that a run which was considered stale in the meantime keeps its state
+    ReminderRun.objects.filter(pk=run.pk, state=ReminderRunState.RUNNING.name).update(
+        state=state.name, last_error=last_error, finished_date=timezone.now()
+    )
+
+
+def dispatch_run(run: ReminderRun, kind: ReminderKind, orders: list[Order]):
+    try:
+        batches = [
+            orders[i : i + REMINDER_BATCH_SIZE]
+            for i in range(0, len(orders), REMINDER_BATCH_SIZE)
+        ]
+        futures = [executor.submit(send_batch, run, kind, batch) for batch in batches]
+        # The batches may wait behind the batches of another run in the shared executor, so the
+        # heartbeat is kept up here instead of only when a batch finishes
+        while wait(futures, timeout=REMINDER_RUN_HEARTBEAT_SECONDS).not_done:
+            ReminderRun.objects.filter(pk=run.pk, state=ReminderRunState.RUNNING.name).update(
+                heartbeat_date=timezone.now()
+            )
+        errors = [f.exception() for f in futures if f.exception() is not None]
+
+        finish_run(
+            run,
+            ReminderRunState.FAILED if errors else ReminderRunState.DONE,
+            "\n".join(repr(e) for e in errors),
+        )
+    finally:
+        close_old_connections()
+
+
+def send_batch(run: ReminderRun, kind: ReminderKind, orders: list[Order]):
+    try:
+        # A run which was considered stale in the meantime must not send anymore
+        if not ReminderRun.objects.filter(
+            pk=run.pk, state=ReminderRunState.RUNNING.name
+        ).exists():
+            return
+
+        create_email = (
+            create_first_reminder_email
+            if kind == ReminderKind.REMINDER
+            else create_first_warning_email
+        )
+        emails = [create_email(order) for order in orders]
+
+        # All emails of a batch are sent over the same SMTP session, each one waits for its slot
+        # of the rate limit. Only orders whose email was actually sent are marked as reminded.
+        results = send_emails(emails, before_send=rate_limiter.wait)
+        sent_codes = [order.pk for order, was_sent in zip(orders, results) if was_sent]
+
+        now = timezone.now()
+        if kind == ReminderKind.REMINDER:
+            Order.objects.filter(pk__in=sent_codes).update(
+                reminder_sent=True, reminder_date=now, last_modified=now
+            )
+        else:
+            Order.objects.filter(pk__in=sent_codes).update(
+                warning_sent=True, warning_date=now, last_modified=now
+            )
+
+        ReminderRun.objects.filter(pk=run.pk).update(
+            num_sent=F("num_sent") + len(sent_codes),
+            num_failed=F("num_failed") + len(orders) - len(sent_codes),
+            heartbeat_date=now,
+        )
+    finally:
+        close_old_connections()
 
-        num_tickets = order.number_discount + order.number_regular
-        body = f"""
+
+def create_first_reminder_email(order: Order):
+    subject = f"Zahlungserinnerung {NAME_ORCHESTRA} {order.reference_code}"
+
+    num_tickets = order.number_discount + order.number_regular
+    body = f"""
 Liebe*r {order.name},
 
-nochmals herzlichen Dank für Ihre Bestellung vom {order.order_date_german_tz_str} (Rechnungsnummer {order.reference_code}) bei der {NAME_ORCHESTRA}! Sie haben {f"{num_tickets} Tickets" if num_tickets > 1 else "ein Ticket"} für das Konzert "{order.event}" bestellt.
+nochmals herzlichen Dank für Ihre Bestellung vom {order.order_date_german_tz_str} (Rechnungsnummer {order.reference_code}) bei der {NAME_ORCHESTRA}! Sie haben {f"{num_tickets} Tickets" if num_tickets > 1 else "ein Ticket"} für das Konzert "{get_event_display(order.event)}" bestellt.
 Leider ist bisher noch keine Zahlung für diese Bestellung bei uns eingegangen. Falls Sie die Zahlungen bereits getätigt haben, brauchen Sie nichts weiter zu unternehmen. Falls Sie die Zahlung vergessen haben – kein Problem! Überweisen Sie diese bitte schnellstmöglich auf folgendes Konto:
 
 Betrag: {calculate_ticket_price(order)} €
@@ -65,45 +219,19 @@ Verwendungszweck: Karten {order.reference_code}
 Mit musikalischen Grüßen,
 {EMAIL_CLOSING}
 """
-
-        send_email(
-            subject=subject, body=body, recipients=[order.email], bcc_email=SENDER_EMAIL
-        )
-
-        order.reminder_sent = True
-        order.reminder_date = timezone.now()
-        order.save()
-
-
-def send_first_warnings():
-    before_grace_period_first_warning = timezone.now() - timedelta(
-        days=WARNING_GRACE_PERIOD_DAYS + BANK_TRANSFER_TIME_DAYS
+    return build_email(
+        subject=subject, body=body, recipients=[order.email], bcc_email=SENDER_EMAIL
     )
 
-    first_warning_orders = list(
-        Order.objects.filter(
-            is_paid=False,
-            is_deleted=False,
-            reminder_sent=True,
-            reminder_date__lte=before_grace_period_first_warning,
-            warning_sent=False,
-        )
-    )
-    background_thread = threading.Thread(
-        target=send_first_warning_emails(first_warning_orders)
-    )
-    background_thread.start()
-
 
-def send_first_warning_emails(unpaid_orders: list[Order]):
-    for order in unpaid_orders:
-        subject = f"Mahnung {NAME_ORCHESTRA} {order.reference_code}"
+def create_first_warning_email(order: Order):
+    subject = f"Mahnung {NAME_ORCHESTRA} {order.reference_code}"
 
-        num_tickets = order.number_discount + order.number_regular
-        body = f"""
+    num_tickets = order.number_discount + order.number_regular
+    body = f"""
 Liebe*r {order.name},
 
-Sie haben am {order.order_date_german_tz_str} (Rechnungsnummer {order.reference_code}) bei uns {f"{num_tickets} Tickets" if num_tickets > 1 else "ein Ticket"} für das Konzert "{order.event}" bestellt.
+Sie haben am {order.order_date_german_tz_str} (Rechnungsnummer {order.reference_code}) bei uns {f"{num_tickets} Tickets" if num_tickets > 1 else "ein Ticket"} für das Konzert "{get_event_display(order.event)}" bestellt.
 
 Leider ist bisher immer noch keine Zahlung für diese Bestellung bei uns eingegangen. Wir haben Ihnen bereits eine Zahlungserinnerung am {datetime_as_german_date_str(order.reminder_date)} per Email geschickt. Falls Sie die Zahlungen in der Zwischenzeit getätigt haben, brauchen Sie nichts weiter zu unternehmen. Falls Sie noch nicht gezahlt haben, holen Sie dies bitte schnellstmöglich nach. Ansonsten müssen wir Ihnen leider eine postalische Mahnung zzgl. Verzugszinsen und einer Bearbeitungsgebühr zukommen zu lassen.
 
@@ -115,11 +243,6 @@ Verwendungszweck: Karten {order.reference_code}
 Mit freundlichen Grüßen,
 {EMAIL_CLOSING}
 """
-
-        send_email(
-            subject=subject, body=body, recipients=[order.email], bcc_email=SENDER_EMAIL
-        )
-
-        order.warning_sent = True
-        order.warning_date = timezone.now()
-        order.save()
+    return build_email(
+        subject=subject, body=body, recipients=[order.email], bcc_email=SENDER_EMAIL
+    )
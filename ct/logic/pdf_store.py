@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+
+from ct.constants import TICKET_PRICE_DISCOUNT, TICKET_PRICE_REGULAR
+from ct.logic.render_pool import submit_render
+from ct.logic.ticket_token import get_qr_code_content
+from ct.models.event import Event
+from ct.models.order import Order
+from ct.models.ticket import Ticket
+
+# Increase when the layout of invoices or tickets changes, so that no stored PDF is used anymore
+PDF_STORE_VERSION = 2
+
+
+# Rendered PDFs are stored on disk as <PDF_STORE_DIR>/<reference code>/<content hash>.pdf. The hash
+# covers everything which is printed on the PDF, so a changed order or event never hits an old
+# entry, and an unchanged order is served from disk without rendering.
+def get_content_hash(order: Order, tickets: list[Ticket]) -> str:
+    event = order.event
+    content = {
+        "version": PDF_STORE_VERSION,
+        "prices": [str(TICKET_PRICE_DISCOUNT), str(TICKET_PRICE_REGULAR)],
+        "order": [
+            order.reference_code,
+            order.order_date.isoformat(),
+            order.name,
+            order.address,
+            order.number_discount,
+            order.number_regular,
+        ],
+        "event": [
+            event.key,
+            event.datetime.isoformat(),
+            event.location,
+            event.program,
+            event.conductor,
+        ],
+        "tickets": sorted(
+            [t.ticket_code, t.type, get_qr_code_content(t.ticket_code, event.key)] for t in tickets
+        ),
+    }
+    return hashlib.sha256(json.dumps(content).encode("utf-8")).hexdigest()
+
+
+def get_order_dir(reference_code: str) -> Path:
+    return Path(settings.PDF_STORE_DIR) / reference_code
+
+
+def load_pdf(reference_code: str, content_hash: str):
+    try:
+        return (get_order_dir(reference_code) / f"{content_hash}.pdf").read_bytes()
+    except FileNotFoundError:
+        return None
+
+
+def store_pdf(reference_code: str, content_hash: str, pdf: bytes) -> None:
+    order_dir = get_order_dir(reference_code)
+    order_dir.mkdir(parents=True, exist_ok=True)
+
+    # Written to a temporary file first, so that no other process reads a partially written PDF
+    fd, tmp_path = tempfile.mkstemp(dir=order_dir, suffix=".tmp")
+    with os.fdopen(fd, "wb") as file:
+        file.write(pdf)
+    os.replace(tmp_path, order_dir / f"{content_hash}.pdf")
+
+    # Older versions of the PDF of this order are never used again
+    for path in order_dir.iterdir():
+        if path.name != f"{content_hash}.pdf" and path.suffix == ".pdf":
+            path.unlink(missing_ok=True)
+
+
+def get_or_render_pdf(order: Order, tickets: list[Ticket]) -> bytes:
+    return get_or_submit_render(order, tickets)()
+
+
+def get_or_submit_render(order: Order, tickets: list[Ticket]):
+    # Returns a function which returns the PDF bytes. A PDF which is not stored yet is rendered by
+    # the render pool in the meantime, so that several PDFs can be rendered in parallel.
+    content_hash = get_content_hash(order, tickets)
+    pdf = load_pdf(order.reference_code, content_hash)
+    if pdf is not None:
+        return lambda: pdf
+
+    future = submit_render(order, tickets)
+
+    def result():
+        rendered = future.result()
+        store_pdf(order.reference_code, content_hash, rendered)
+        return rendered
+
+    return result
+
+
+def purge_order_pdfs(reference_code: str) -> None:
+    shutil.rmtree(get_order_dir(reference_code), ignore_errors=True)
+
+
+def purge_event_pdfs(event: Event) -> None:
+    # Stored PDFs of a changed event are never hit again, they are only removed to free disk space
+    for reference_code in Order.objects.filter(event=event).values_list("pk", flat=True):
+        purge_order_pdfs(reference_code)
@@ -0,0 +1,148 @@
+import logging
+import threading
+import zipfile
+from collections import deque
+from io import BytesIO
+
+from django.db import close_old_connections
+from django.db.models import Prefetch
+
+from ct.constants import (
+    EMAIL_CLOSING,
+    NAME_ORCHESTRA,
+    REISSUE_EMAIL_BATCH_SIZE,
+    RENDER_POOL_SIZE,
+    SENDER_EMAIL,
+)
+from ct.logic.event_cache import get_event_display
+from ct.logic.pdf_store import get_or_submit_render
+from ct.logic.shared import build_email, send_emails
+from ct.logic.ticket import issue_tickets
+from ct.models.event import Event
+from ct.models.order import Order
+from ct.models.ticket import Ticket
+
+logger = logging.getLogger(__name__)
+
+
+def get_reissue_orders(event: Event):
+    # The tickets which were issued with the order are rendered again, no new tickets are created
+    return (
+        Order.objects.filter(event=event, is_deleted=False)
+        .select_related("event")
+        .prefetch_related(Prefetch("ticket_set", queryset=Ticket.objects.order_by("ticket_code")))
+        .order_by("reference_code")
+    )
+
+
+def render_event_pdfs(event: Event):
+    # Yields (order, PDF bytes) for all orders of the event, in order of their reference codes. PDFs
+    # which are not stored yet are rendered in parallel by the render pool. Only a few PDFs are in flight at the same
+    # time, so that the memory use does not depend on the number of orders.
+    max_in_flight = max(RENDER_POOL_SIZE, 1) * 2
+    in_flight = deque()
+    for order in get_reissue_orders(event).iterator(chunk_size=100):
+        tickets = list(order.ticket_set.all())
+        if not tickets:
+            # Orders which were created before tickets were issued at order creation
+            tickets = issue_tickets(order)
+        in_flight.append((order, get_or_submit_render(order, tickets)))
+        if len(in_flight) >= max_in_flight:
+            order, result = in_flight.popleft()
+            yield order, result()
+
+    while in_flight:
+        order, result = in_flight.popleft()
+        yield order, result()
+
+
+class ZipStream:
+    # Write-only file for zipfile, whose written data is taken out after every file, so that a ZIP
+    # archive can be streamed without keeping it in memory
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def generate_pdfs_zip(events: list[Event]):
+    # Yields the chunks of a ZIP archive with one folder per event and one PDF per order
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_STORED) as archive:
+        for event in events:
+            for order, pdf in render_event_pdfs(event):
+                archive.writestr(f"{event.key}/{order.reference_code}.pdf", pdf)
+                yield stream.take()
+    yield stream.take()
+
+
+def send_event_pdfs(event: Event) -> tuple[int, int]:
+    # Sends the new PDFs to all customers of the event. Returns the number of sent and failed emails.
+    num_sent = 0
+    num_failed = 0
+    batch = []
+    for order, pdf in render_event_pdfs(event):
+        batch.append(create_reissue_email(order, pdf))
+        if len(batch) >= REISSUE_EMAIL_BATCH_SIZE:
+            results = send_emails(batch)
+            num_sent += sum(results)
+            num_failed += len(results) - sum(results)
+            batch = []
+
+    if batch:
+        results = send_emails(batch)
+        num_sent += sum(results)
+        num_failed += len(results) - sum(results)
+    return num_sent, num_failed
+
+
+def send_event_pdfs_in_background(events: list[Event]) -> None:
+    def send():
+        try:
+            for event in events:
+                num_sent, num_failed = send_event_pdfs(event)
+                logger.info(
+                    "Reissued PDFs of event %s: %s sent, %s failed", event.key, num_sent, num_failed
+                )
+        except Exception:
+            logger.exception("Reissuing PDFs failed")
+        finally:
+            close_old_connections()
+
+    threading.Thread(target=send).start()
+
+
+def create_reissue_email(order: Order, pdf: bytes):
+    subject = f"{NAME_ORCHESTRA} - Aktualisierte Tickets {order.reference_code}"
+
+    num_tickets = order.number_discount + order.number_regular
+    body = f"""
+Liebe*r {order.name},
+
+die Angaben zu dem Konzert, für das Sie {f"{num_tickets} Tickets" if num_tickets > 1 else "ein Ticket"} bestellt haben, haben sich geändert. Das Konzert findet am {get_event_display(order.event)} statt.
+
+Anbei finden Sie Ihre aktualisierte Rechnung und {"Ihre Tickets" if num_tickets > 1 else "Ihr Ticket"} als PDF-Datei. Die Ticketcodes haben sich nicht geändert, {"Ihre bisherigen Tickets bleiben" if num_tickets > 1 else "Ihr bisheriges Ticket bleibt"} also gültig.
+
+Wir freuen uns auf Ihren Besuch!
+{EMAIL_CLOSING}
+"""
+    attachment_filename = f"{order.order_date_german_tz_str} Rechnung_Tickets_ct.pdf"
+
+    return build_email(
+        subject=subject,
+        body=body,
+        recipients=[order.email],
+        bcc_email=SENDER_EMAIL,
+        pdf_attachment_content=BytesIO(pdf),
+        attachment_name=attachment_filename,
+    )
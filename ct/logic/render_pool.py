@@ -0,0 +1,111 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from ct.constants import RENDER_POOL_SIZE
+
+# The render processes are started with "spawn" instead of forking the calling process, which
+# usually runs other threads already. This module must therefore be importable before Django is set
+# up, so models and the rendering code are only imported inside the functions.
+
+
+def init_render_process() -> None:
+    # Runs once in every render process, before its first job
+    import django
+
+    django.setup()
+
+    # Import ReportLab, the styles and the images before the first job instead of during it
+    import ct.logic.invoice  # noqa: F401
+    import ct.logic.styles  # noqa: F401
+    from ct.logic.assets import preload_assets
+
+    preload_assets()
+
+
+def render_in_process(order, tickets: list) -> bytes:
+    from ct.logic.invoice import create_invoice_and_tickets
+
+    return create_invoice_and_tickets(order, tickets).getvalue()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_size = RENDER_POOL_SIZE
+
+
+def set_render_pool_size(size: int) -> None:
+    # For processes which share the cores with other rendering processes. Must be called before
+    # the first render.
+    global _pool_size
+    _pool_size = size
+
+
+def get_render_pool():
+    global _pool
+    with _pool_lock:
+        # A pool inherited from the parent process must not be used in a forked process
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = ProcessPoolExecutor(
+                max_workers=_pool_size,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_render_process,
+            )
+            _pool.pid = os.getpid()
+            # Start all processes right away, so that the first orders do not wait for the startup
+            for _ in range(_pool_size):
+                _pool.submit(os.getpid)
+        return _pool
+
+
+def discard_render_pool(pool) -> None:
+    # A pool whose process crashed (e.g. out of memory) fails all its jobs with BrokenProcessPool
+    # and cannot be used anymore, so the next job starts a new pool
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+
+
+def submit_render(order, tickets: list) -> Future:
+    # Returns a future of the PDF bytes. Without a pool, the PDF is rendered right away.
+    if _pool_size <= 0:
+        future = Future()
+        try:
+            future.set_result(render_in_process(order, tickets))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    pool = get_render_pool()
+    try:
+        future = pool.submit(render_in_process, order, tickets)
+    except BrokenProcessPool:
+        discard_render_pool(pool)
+        pool = get_render_pool()
+        future = pool.submit(render_in_process, order, tickets)
+
+    def discard_if_broken(future):
+        # The job itself fails, it is retried like any other failed render
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            discard_render_pool(pool)
+
+    future.add_done_callback(discard_if_broken)
+    return future
+
+
+def render_invoice_and_tickets(order, tickets: list) -> BytesIO:
+    # Renders the PDF of an order in the render pool, so that the calling process (a web worker or a
+    # fulfillment worker) does not block other threads on the GIL in the meantime
+    return BytesIO(submit_render(order, tickets).result())
+
+
+def shutdown_render_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool.pid == os.getpid():
+            _pool.shutdown()
+        _pool = None
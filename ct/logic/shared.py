@@ -2,13 +2,13 @@ from email.mime.application import MIMEApplication
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from io import BytesIO
-import smtplib
 
 import pytz
-from ct.constants import EMAIL_PASSWORD, EMAIL_PORT, EMAIL_SERVER, SENDER_EMAIL
+from ct.constants import SENDER_EMAIL
+from ct.logic.mail import get_mail_pool
 
 
-def send_email(
+def build_email(
     subject: str,
     body: str,
     recipients: list,
@@ -35,14 +35,36 @@ def send_email(
     msg["From"] = SENDER_EMAIL
     msg["To"] = ", ".join(recipients)
 
+    envelope_recipients = list(recipients)
     if bcc_email:
-        recipients.append(bcc_email)
+        envelope_recipients.append(bcc_email)
+
+    return msg, envelope_recipients
+
+
+def send_email(
+    subject: str,
+    body: str,
+    recipients: list,
+    pdf_attachment_content: BytesIO = None,
+    attachment_name=None,
+    bcc_email: str = None,
+):
+    msg, envelope_recipients = build_email(
+        subject,
+        body,
+        recipients,
+        pdf_attachment_content=pdf_attachment_content,
+        attachment_name=attachment_name,
+        bcc_email=bcc_email,
+    )
+    get_mail_pool().send_message(msg, envelope_recipients)
+
 
-    # Connect to the SMTP server and send the email
-    with smtplib.SMTP(EMAIL_SERVER, EMAIL_PORT) as server:
-        server.starttls()
-        server.login(SENDER_EMAIL, EMAIL_PASSWORD)
-        server.sendmail(SENDER_EMAIL, recipients, msg.as_string())
+def send_emails(emails: list, before_send=None) -> list:
+    # Sends a batch of emails built with build_email over a shared SMTP session. Returns for each
+    # email whether it was sent successfully. See SMTPConnectionPool.send_messages for before_send.
+    return get_mail_pool().send_messages(emails, before_send=before_send)
 
 
 def datetime_as_german_date_str(dt) -> str:
@@ -1,154 +1,173 @@
-import json
 import uuid
-from datetime import timedelta
-from pathlib import Path
+from functools import lru_cache
 
-import pytz
+from django.db import IntegrityError, transaction
 from reportlab.graphics.barcode.qr import QrCode, QrCodeWidget
 from reportlab.graphics.shapes import Drawing
 from reportlab.lib import colors
 from reportlab.lib.units import cm
-from reportlab.lib.utils import ImageReader
+from reportlab.lib.utils import _digester
 from reportlab.platypus import Flowable, Paragraph
 from reportlab.platypus.flowables import Flowable
 
+from ct.logic.assets import draw_image
+from ct.logic.event_cache import CachedEvent, get_event_display
 from ct.logic.styles import STYLE_NORMAL, STYLE_NORMAL_BOLD, STYLE_SMALL
+from ct.logic.ticket_token import get_qr_code_content
 from ct.models.ticket import Ticket, TicketType
 
 
-# Create a new ticket object for a given order
-def create_ticket(order, type: TicketType):
-    if type not in TicketType:
-        raise RuntimeError("Invalid ticket type")
-
-    ticket_code = generate_random_ticket_code(order)
-    ticket = Ticket(ticket_code=ticket_code, order=order, type=type.name)
-    ticket.save()
-    return ticket
-
-
-def generate_random_ticket_code(order):
-    while True:
-        # Generate a uuid
-        ticket_code = str(uuid.uuid4())
-        if not Ticket.objects.filter(ticket_code=ticket_code).exists():
-            return ticket_code
-
-
-def insert_image(canvas, image_path, x, y, width=None, height=None):
-    img = ImageReader(image_path)
-    img_width, img_height = img.getSize()
-
-    if width is None and height is not None:
-        width = (height / img_height) * img_width
-    elif height is None and width is not None:
-        height = (width / img_width) * img_height
-
-    canvas.drawImage(img, x, y, width, height)
-
-
-class TicketFlowable(Flowable):
-    def __init__(self, order, width, ticket):
-        Flowable.__init__(self)
-        self.width = width
-        self.height = 250
-        self.PADDING = 20
-        self.ticket = ticket
-        self.order = order
-
-    def wrap(self, availWidth, availHeight):
-        return self.width, self.height
-
-    def draw(self):
-        # Set up the drawing context
-        c = self.canv
-        c.saveState()
-
+TICKET_ISSUE_MAX_ATTEMPTS = 3
+
+
+# Create all tickets of an order with a single INSERT
+def issue_tickets(order) -> list[Ticket]:
+    for attempt in range(TICKET_ISSUE_MAX_ATTEMPTS):
+        tickets = [
+            Ticket(
+                ticket_code=generate_random_ticket_code(),
+                order=order,
+                type=TicketType.DISCOUNT.name,
+            )
+            for _ in range(order.number_discount)
+        ] + [
+            Ticket(
+                ticket_code=generate_random_ticket_code(),
+                order=order,
+                type=TicketType.REGULAR.name,
+            )
+            for _ in range(order.number_regular)
+        ]
+
+        # The primary key constraint guards against (very unlikely) duplicate codes instead of
+        # checking every code with a separate query. On a collision, the whole batch is retried.
+        try:
+            with transaction.atomic():
+                Ticket.objects.bulk_create(tickets)
+            return tickets
+        except IntegrityError:
+            if attempt == TICKET_ISSUE_MAX_ATTEMPTS - 1:
+                raise
+
+
+def generate_random_ticket_code() -> str:
+    return str(uuid.uuid4())
+
+
+TICKET_HEIGHT = 250
+
+
+class TicketTemplate:
+    # Everything on a ticket which is the same for all tickets of an event. The static layer is
+    # drawn once per PDF as a form XObject, which every ticket of the document references.
+    def __init__(self, event: CachedEvent):
+        self.program_text = "<br/>".join(event.program_lines)
+        self.conductor_text = f"Dirigent: {event.conductor}"
+        self.date_text = f"{event.weekday}, den {event.date_str} um {event.time_str} Uhr"
+        self.location = event.location
+        self.entrance_time = event.entrance_time_str
+        self.form_name = "ticket" + _digester(repr(event.fields).encode("utf-8"))
+
+    def draw_static_layer(self, c, width, height):
         # Draw the outer box with a border
         c.setStrokeColor(colors.black)
         c.setLineWidth(1)
-        c.rect(0, 0, self.width, self.height)
+        c.rect(0, 0, width, height)
 
         # Draw logos on the left side of the ticket
         ORCHESTRA_LOGO_WIDTH = 160
-        insert_image(
+        draw_image(
             c,
-            Path(__file__).parent.parent / "static" / "ct" / "logo.png",
-            x=self.width / 4 - ORCHESTRA_LOGO_WIDTH / 2,
+            "logo.png",
+            x=width / 4 - ORCHESTRA_LOGO_WIDTH / 2,
             y=105,
             width=ORCHESTRA_LOGO_WIDTH,
         )
 
         SPONSOR1_LOGO_WIDTH = 90
-        insert_image(
+        draw_image(
             c,
-            Path(__file__).parent.parent / "static" / "ct" / "sponsor1.jpg",
-            x=self.width / 4 - SPONSOR1_LOGO_WIDTH / 2,
+            "sponsor1.jpg",
+            x=width / 4 - SPONSOR1_LOGO_WIDTH / 2,
             y=55,
             width=SPONSOR1_LOGO_WIDTH,
         )
 
         SPONSOR2_LOGO_WIDTH = 80
-        insert_image(
+        draw_image(
             c,
-            Path(__file__).parent.parent / "static" / "ct" / "sponsor2.png",
-            x=self.width / 4 - SPONSOR2_LOGO_WIDTH / 2,
+            "sponsor2.png",
+            x=width / 4 - SPONSOR2_LOGO_WIDTH / 2,
             y=15,
             width=SPONSOR2_LOGO_WIDTH,
         )
 
-        # Create paragraphs on the left
-        p1 = Paragraph(
-            "<br/>".join(json.loads(self.order.event.program)), STYLE_NORMAL_BOLD
-        )
-        p1.wrap(250, self.height)
-        p1.drawOn(c, self.width / 2, self.height - 45)
-        p2 = Paragraph(f"Dirigent: {self.order.event.conductor}", STYLE_NORMAL)
-        p2.wrap(250, self.height)
-        p2.drawOn(c, self.width / 2, self.height - 65)
+        # Create paragraphs on the right
+        p1 = Paragraph(self.program_text, STYLE_NORMAL_BOLD)
+        p1.wrap(250, height)
+        p1.drawOn(c, width / 2, height - 45)
+        p2 = Paragraph(self.conductor_text, STYLE_NORMAL)
+        p2.wrap(250, height)
+        p2.drawOn(c, width / 2, height - 65)
 
-        # Generate and draw the QR code on the right
-        qr_code = QrCode(self.ticket.ticket_code, height=100, width=100)
-        qr_code.drawOn(c, self.width / 2 + 50, 80)
+        p3 = Paragraph(self.date_text, STYLE_NORMAL)
+        p3.wrap(250, height)
+        p3.drawOn(c, width / 2, 60)
 
-        # Calculate weekday from event date
-        # Set locale to Germany so that the weekday is returned in German
-        weekday = self.order.event.datetime.astimezone(
-            pytz.timezone("Europe/Berlin")
-        ).strftime("%A")
-
-        # English to German weekday translation dictionary
-        weekday_translation = {
-            "Monday": "Montag",
-            "Tuesday": "Dienstag",
-            "Wednesday": "Mittwoch",
-            "Thursday": "Donnerstag",
-            "Friday": "Freitag",
-            "Saturday": "Samstag",
-            "Sunday": "Sonntag",
-        }
-        localized_event_time = self.order.event.datetime.astimezone(
-            pytz.timezone("Europe/Berlin")
-        )
-        p3 = Paragraph(
-            f"{weekday_translation[weekday]}, den {localized_event_time.strftime(r'%d.%m.%Y')} "
-            f"um {localized_event_time.strftime(r'%H:%M')} Uhr",
-            STYLE_NORMAL,
-        )
-        p3.wrap(250, self.height)
-        p3.drawOn(c, self.width / 2, 60)
+        p4 = Paragraph(self.location, STYLE_NORMAL_BOLD)
+        p4.wrap(250, height)
+        p4.drawOn(c, width / 2, 45)
+
+    def draw(self, c, width, height):
+        if not c.hasForm(self.form_name):
+            c.beginForm(self.form_name)
+            self.draw_static_layer(c, width, height)
+            c.endForm()
+        c.doForm(self.form_name)
+
+
+@lru_cache(maxsize=32)
+def _get_ticket_template(event: CachedEvent) -> TicketTemplate:
+    return TicketTemplate(event)
+
+
+def get_ticket_template(event) -> TicketTemplate:
+    # Cached per process. A changed event results in a new cached event and thus a new template.
+    return _get_ticket_template(get_event_display(event))
+
+
+class TicketFlowable(Flowable):
+    def __init__(self, order, width, ticket, use_template=True):
+        Flowable.__init__(self)
+        self.width = width
+        self.height = TICKET_HEIGHT
+        self.PADDING = 20
+        self.ticket = ticket
+        self.order = order
+        self.use_template = use_template
 
-        p4 = Paragraph(self.order.event.location, STYLE_NORMAL_BOLD)
-        p4.wrap(250, self.height)
-        p4.drawOn(c, self.width / 2, 45)
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
 
-        entrance_time = (
-            (self.order.event.datetime - timedelta(minutes=30))
-            .astimezone(pytz.timezone("Europe/Berlin"))
-            .strftime(r"%H:%M")
+    def draw(self):
+        # Set up the drawing context
+        c = self.canv
+        c.saveState()
+
+        template = get_ticket_template(self.order.event)
+        if self.use_template:
+            template.draw(c, self.width, self.height)
+        else:
+            template.draw_static_layer(c, self.width, self.height)
+
+        # Generate and draw the QR code on the right
+        qr_code = QrCode(
+            get_qr_code_content(self.ticket.ticket_code, self.order.event.key), height=100, width=100
         )
+        qr_code.drawOn(c, self.width / 2 + 50, 80)
+
         p5 = Paragraph(
-            f"{self.ticket.display_type}, Freie Platzwahl, Einlass ab {entrance_time} Uhr",
+            f"{self.ticket.display_type}, Freie Platzwahl, Einlass ab {template.entrance_time} Uhr",
             STYLE_SMALL,
         )
         p5.wrap(140, self.height)
@@ -0,0 +1,69 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import uuid
+
+from django.conf import settings
+
+# Tokens which are printed as QR codes on the tickets:
+#   base32(version (1 byte) | ticket id (16 bytes) | HMAC-SHA256 tag (10 bytes))
+# The tag is calculated with the verification key of the event, so a token is only valid for the
+# event it was issued for. Scanners which hold the key of an event can verify tokens without any
+# database or network access. Base32 uses only characters of the alphanumeric QR mode, which
+# results in a smaller QR code than the UUID in byte mode.
+TICKET_TOKEN_VERSION = 1
+TICKET_TOKEN_TAG_LENGTH = 10
+TICKET_TOKEN_LENGTH = 44  # Characters of a token without the base32 padding
+
+
+def get_event_verification_key(event_key: str) -> bytes:
+    # Derived from the secret, so that no key needs to be stored per event
+    return hmac.new(
+        settings.TICKET_TOKEN_SECRET.encode("utf-8"),
+        b"ticket-token:" + event_key.encode("utf-8"),
+        hashlib.sha256,
+    ).digest()
+
+
+def calculate_tag(verification_key: bytes, payload: bytes) -> bytes:
+    return hmac.new(verification_key, payload, hashlib.sha256).digest()[:TICKET_TOKEN_TAG_LENGTH]
+
+
+def create_ticket_token(ticket_code: str, event_key: str) -> str:
+    return sign_ticket_code(ticket_code, get_event_verification_key(event_key))
+
+
+def get_qr_code_content(ticket_code: str, event_key: str) -> str:
+    # What is printed as QR code on a ticket, see PRINT_TICKET_TOKENS
+    if settings.PRINT_TICKET_TOKENS:
+        return create_ticket_token(ticket_code, event_key)
+    return ticket_code
+
+
+def sign_ticket_code(ticket_code: str, verification_key: bytes) -> str:
+    payload = bytes([TICKET_TOKEN_VERSION]) + uuid.UUID(ticket_code).bytes
+    tag = calculate_tag(verification_key, payload)
+    return base64.b32encode(payload + tag).decode("ascii").rstrip("=")
+
+
+def verify_ticket_token(token: str, verification_key: bytes):
+    # Returns the ticket code of a valid token, otherwise None
+    if len(token) != TICKET_TOKEN_LENGTH:
+        return None
+    try:
+        data = base64.b32decode(token.upper() + "=" * 4)
+    except (binascii.Error, ValueError):
+        return None
+
+    payload, tag = data[:-TICKET_TOKEN_TAG_LENGTH], data[-TICKET_TOKEN_TAG_LENGTH:]
+    if payload[0] != TICKET_TOKEN_VERSION:
+        return None
+    if not hmac.compare_digest(tag, calculate_tag(verification_key, payload)):
+        return None
+    return str(uuid.UUID(bytes=payload[1:]))
+
+
+def is_ticket_token(code: str) -> bool:
+    # Ticket codes (UUIDs with dashes) and tokens can be told apart by their length
+    return len(code) == TICKET_TOKEN_LENGTH
@@ -0,0 +1,147 @@
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import override_settings
+from django.test.utils import setup_databases, teardown_databases
+from django.utils import timezone
+
+from ct.logic.event import get_event_statistics
+from ct.logic.payment_reminder import get_first_reminder_orders, get_first_warning_orders
+from ct.models.event import Event
+from ct.models.order import Order
+
+BENCHMARK_INDEXES = [index.name for index in Order._meta.indexes]
+
+
+class Command(BaseCommand):
+    help = (
+        "Shows the query plans and timings of the order queries on a synthetic table, with and "
+        "without the order indexes. Runs in a separate test database of the configured database "
+        "server (SQLite locally, PostgreSQL with IS_DEPLOYED=True, which needs the CREATEDB "
+        "permission), which is deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=1_000_000, help="Synthetic orders.")
+        parser.add_argument("--events", type=int, default=4, help="Synthetic events.")
+        parser.add_argument("--runs", type=int, default=5, help="Executions per query.")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        # Never touches live data: dropping the indexes would lock the orders table and the bulk
+        # insert would hold the write lock for the whole run. The shared cache is replaced, so that
+        # the synthetic events do not invalidate the event cache of the running processes.
+        with tempfile.TemporaryDirectory() as tmp_dir, override_settings(
+            CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+        ):
+            if connection.vendor == "sqlite":
+                # A file instead of the in-memory database, like the configured database
+                connection.settings_dict["TEST"]["NAME"] = os.path.join(tmp_dir, "benchmark.sqlite3")
+            old_config = setup_databases(
+                verbosity=0, interactive=False, aliases={DEFAULT_DB_ALIAS}
+            )
+            try:
+                self.run_benchmark(options)
+            finally:
+                connections.close_all()
+                teardown_databases(old_config, verbosity=0)
+
+    def run_benchmark(self, options):
+        start = time.perf_counter()
+        events = self.create_events(options["events"])
+        self.create_orders(events, options["orders"], random.Random(options["seed"]))
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        self.stdout.write(
+            f"{options['orders']} Bestellungen erzeugt in {time.perf_counter() - start:.1f} s\n"
+        )
+
+        self.run_queries(events, options["runs"], "Mit Indizes")
+        with connection.cursor() as cursor:
+            for name in BENCHMARK_INDEXES:
+                cursor.execute(f"DROP INDEX {connection.ops.quote_name(name)}")
+            cursor.execute("ANALYZE")
+        self.run_queries(events, options["runs"], "Ohne Indizes")
+
+    def create_events(self, number):
+        return [
+            Event.objects.create(
+                key=f"benchmark-{i}",
+                location="Stadthalle Heidelberg",
+                datetime=timezone.now() + timedelta(days=30 + i),
+                program=json.dumps(["L. v. Beethoven: Sinfonie Nr. 5"]),
+                conductor="Johann S. Bach",
+                max_number_tickets=1_000_000,
+                is_active=i % 2 == 0,
+            )
+            for i in range(number)
+        ]
+
+    def create_orders(self, events, number, rng):
+        # Most orders are paid, a few are deleted and only a small fraction is still waiting for a
+        # reminder or warning, as in a real sale.
+        now = timezone.now()
+        batch = []
+        for i in range(number):
+            order_date = now - timedelta(minutes=rng.randrange(120 * 24 * 60))
+            order = Order(
+                reference_code=f"B{i:09d}",
+                order_date=order_date,
+                name="Max Mustermann",
+                address="Bachweg 5, 12345 Eisenach",
+                email="max@example.com",
+                event=rng.choice(events),
+                number_discount=rng.randrange(3),
+                number_regular=rng.randrange(1, 4),
+                delete_code="benchmark",
+                is_deleted=rng.random() < 0.05,
+                is_paid=rng.random() < 0.9,
+            )
+            if not order.is_paid and order_date < now - timedelta(days=14) and rng.random() < 0.8:
+                order.reminder_sent = True
+                order.reminder_date = order_date + timedelta(days=14)
+                if order_date < now - timedelta(days=28) and rng.random() < 0.5:
+                    order.warning_sent = True
+                    order.warning_date = order_date + timedelta(days=28)
+            batch.append(order)
+
+            if len(batch) == 10_000:
+                Order.objects.bulk_create(batch)
+                batch = []
+        Order.objects.bulk_create(batch)
+
+    def run_queries(self, events, runs, title):
+        queries = [
+            ("Zahlungserinnerungen", get_first_reminder_orders),
+            ("Mahnungen", get_first_warning_orders),
+            ("Statistik der Konzerte", get_event_statistics),
+            (
+                "Bestellungen eines Konzerts",
+                lambda: Order.objects.filter(event=events[0], is_deleted=False).values_list("pk"),
+            ),
+        ]
+
+        self.stdout.write(f"=== {title} ===")
+        for name, get_queryset in queries:
+            # Only the database is measured, not the creation of the model instances
+            sql, params = get_queryset().query.sql_with_params()
+            durations = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                with connection.cursor() as cursor:
+                    cursor.execute(sql, params)
+                    num_rows = len(cursor.fetchall())
+                durations.append(time.perf_counter() - start)
+
+            self.stdout.write(
+                f"{name}: {num_rows} Zeilen, Median {statistics.median(durations) * 1000:.1f} ms, "
+                f"Min {min(durations) * 1000:.1f} ms"
+            )
+            self.stdout.write(get_queryset().explain() + "\n")
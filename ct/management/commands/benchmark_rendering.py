@@ -0,0 +1,72 @@
+import json
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ct.logic.invoice import create_invoice_and_tickets
+from ct.logic.ticket import generate_random_ticket_code
+from ct.models.event import Event
+from ct.models.order import Order
+from ct.models.ticket import Ticket, TicketType
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the rendering time of invoices and tickets with and without the "
+        "per-event PDF templates. Does not write to the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tickets", type=int, default=10, help="Tickets per order.")
+        parser.add_argument("--runs", type=int, default=10, help="Rendered orders per mode.")
+
+    def handle(self, *args, **options):
+        # Unsaved objects, so that the benchmark can run against any database
+        event = Event(
+            key="benchmark",
+            location="Stadthalle Heidelberg",
+            datetime=timezone.now() + timedelta(days=30),
+            program=json.dumps(["L. v. Beethoven: Sinfonie Nr. 5", "J. Brahms: Sinfonie Nr. 1"]),
+            conductor="Johann S. Bach",
+            max_number_tickets=options["tickets"],
+        )
+        number_discount = options["tickets"] // 2
+        order = Order(
+            reference_code="BENCHMRK",
+            order_date=timezone.now(),
+            name="Max Mustermann",
+            address="Bachweg 5, 12345 Eisenach",
+            email="max@example.com",
+            event=event,
+            number_discount=number_discount,
+            number_regular=options["tickets"] - number_discount,
+            delete_code="benchmark",
+        )
+        tickets = [
+            Ticket(
+                ticket_code=generate_random_ticket_code(),
+                order=order,
+                type=(TicketType.DISCOUNT if i < number_discount else TicketType.REGULAR).name,
+            )
+            for i in range(options["tickets"])
+        ]
+
+        # Warm up the process-wide caches (images, templates), as a worker process would have
+        create_invoice_and_tickets(order, tickets)
+
+        for use_templates in [False, True]:
+            durations = []
+            for _ in range(options["runs"]):
+                start = time.perf_counter()
+                pdf = create_invoice_and_tickets(order, tickets, use_templates=use_templates)
+                durations.append(time.perf_counter() - start)
+
+            mode = "Mit Templates" if use_templates else "Ohne Templates"
+            self.stdout.write(
+                f"{mode}: Median {statistics.median(durations) * 1000:.1f} ms, "
+                f"Min {min(durations) * 1000:.1f} ms, "
+                f"PDF-Größe {len(pdf.getvalue()) / 1024:.1f} KiB"
+            )
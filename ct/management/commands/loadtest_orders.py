@@ -0,0 +1,263 @@
+import html
+import json
+import os
+import re
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import Count, Sum
+from django.test import Client, override_settings
+from django.test.utils import setup_databases, teardown_databases
+from django.urls import reverse
+from django.utils import timezone
+
+from ct.logic.event import invalidate_availability
+from ct.logic.fulfillment import run_worker
+from ct.models.event import Event
+from ct.models.fulfillment import FulfillmentJob, JobState
+from ct.models.order import Order
+from ct.models.ticket import Ticket
+
+ERROR_MESSAGE_PATTERN = re.compile(r"Bestellung konnte nicht abgeschlossen werden: ([^<]*)")
+
+
+class SinkSMTP:
+    # Accepts every email without sending it, so that a load test never reaches real customers
+    lock = threading.Lock()
+    num_messages = 0
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def starttls(self, *args, **kwargs):
+        pass
+
+    def login(self, *args, **kwargs):
+        pass
+
+    def noop(self):
+        return 250, b"OK"
+
+    def sendmail(self, from_addr, to_addrs, msg, *args, **kwargs):
+        with SinkSMTP.lock:
+            SinkSMTP.num_messages += 1
+        return {}
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Sends concurrent order submissions through the complete view stack and reports latency, "
+        "throughput, errors and oversold events as JSON. Runs in a separate test database of the "
+        "configured database server (SQLite locally, PostgreSQL with IS_DEPLOYED=True, which "
+        "needs the CREATEDB permission), which is deleted afterwards. Emails are not sent."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500, help="Number of orders to submit.")
+        parser.add_argument("--concurrency", type=int, default=20, help="Parallel clients.")
+        parser.add_argument("--events", type=int, default=2, help="Synthetic events.")
+        parser.add_argument(
+            "--tickets-per-event",
+            type=int,
+            default=300,
+            help="Capacity of each event. Lower than the demand to test sold out events.",
+        )
+        parser.add_argument("--tickets-per-order", type=int, default=2)
+        parser.add_argument(
+            "--fulfill",
+            action="store_true",
+            help="Also render and send (into the sink) invoices and tickets of all orders.",
+        )
+
+    def handle(self, *args, **options):
+        # Never touches live data: the events, orders and fulfillment jobs are created in a test
+        # database, and the shared cache and the PDF store are replaced during the test, so that
+        # neither the order form nor the fulfillment workers see them
+        with tempfile.TemporaryDirectory() as tmp_dir, override_settings(
+            CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+            PDF_STORE_DIR=tmp_dir,
+        ):
+            if connection.vendor == "sqlite":
+                # A file instead of the in-memory database, which does not wait for locks
+                connection.settings_dict["TEST"]["NAME"] = os.path.join(tmp_dir, "loadtest.sqlite3")
+            old_config = setup_databases(
+                verbosity=0, interactive=False, aliases={DEFAULT_DB_ALIAS}
+            )
+            try:
+                report = self.run_load_test(options)
+            finally:
+                connections.close_all()
+                teardown_databases(old_config, verbosity=0)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def run_load_test(self, options):
+        events = self.create_events(options["events"], options["tickets_per_event"])
+        url = reverse("create_order")
+        local = threading.local()
+
+        def submit(i: int):
+            # Every thread uses its own client and database connection, like a server worker would
+            if not hasattr(local, "client"):
+                local.client = Client()
+            event = events[i % len(events)]
+            data = {
+                "name": f"Last Test {i}",
+                "address_street": "Bachweg",
+                "address_number": "5",
+                "address_zip": "12345",
+                "address_city": "Eisenach",
+                "email": f"loadtest-{i}@example.com",
+                "event": event.key,
+                "number_discount": 0,
+                "number_regular": options["tickets_per_order"],
+                "accept_agb": "on",
+            }
+
+            start = time.perf_counter()
+            message = ""
+            try:
+                response = local.client.post(url, data)
+                content = response.content.decode()
+                if "Bestellung erfolgreich" in content:
+                    result = "ok"
+                elif "Es sind nur noch" in content:
+                    result = "sold_out"
+                else:
+                    result = "error"
+                    match = ERROR_MESSAGE_PATTERN.search(content)
+                    if match:
+                        message = html.unescape(match.group(1))
+                    elif response.status_code == 200:
+                        message = "Formular ungültig"
+                    else:
+                        message = f"HTTP {response.status_code}"
+            except Exception as e:
+                result = "error"
+                message = repr(e)
+            duration = time.perf_counter() - start
+            return result, duration, message
+
+        def close_connection(_):
+            connections.close_all()
+
+        with mock.patch("ct.logic.mail.smtplib.SMTP", SinkSMTP):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+                results = list(executor.map(submit, range(options["requests"])))
+                # Connections are per thread and are not closed automatically
+                list(executor.map(close_connection, range(options["concurrency"])))
+            wall_time = time.perf_counter() - start
+
+            fulfillment = None
+            if options["fulfill"]:
+                # The jobs are claimed like in a fulfillment worker. Failed jobs are retried later,
+                # so only the jobs which end DONE count.
+                SinkSMTP.num_messages = 0
+                start = time.perf_counter()
+                run_worker("loadtest", once=True)
+                fulfillment_time = time.perf_counter() - start
+                states = dict(
+                    FulfillmentJob.objects.values_list("state").annotate(count=Count("pk"))
+                )
+                num_done = states.pop(JobState.DONE.name, 0)
+                fulfillment = {
+                    "orders": num_done,
+                    "not_done": states,
+                    "seconds": round(fulfillment_time, 3),
+                    "orders_per_second": round(num_done / fulfillment_time, 2)
+                    if fulfillment_time
+                    else None,
+                    "emails": SinkSMTP.num_messages,
+                }
+
+        report = self.create_report(results, wall_time, events, options)
+        report["fulfillment"] = fulfillment
+        return report
+
+    def create_events(self, number, max_number_tickets):
+        prefix = f"loadtest-{int(time.time())}"
+        events = [
+            Event.objects.create(
+                key=f"{prefix}-{i}",
+                location="Stadthalle Heidelberg",
+                datetime=timezone.now() + timedelta(days=30),
+                program=json.dumps(["L. v. Beethoven: Sinfonie Nr. 5"]),
+                conductor="Johann S. Bach",
+                max_number_tickets=max_number_tickets,
+            )
+            for i in range(number)
+        ]
+        invalidate_availability()
+        return events
+
+    def create_report(self, results, wall_time, events, options):
+        durations = sorted(duration for _, duration, _ in results)
+        counts = {result: 0 for result in ["ok", "sold_out", "error"]}
+        for result, _, _ in results:
+            counts[result] += 1
+        error_messages = Counter(message for result, _, message in results if result == "error")
+
+        if len(durations) > 1:
+            percentiles = statistics.quantiles(durations, n=100, method="inclusive")
+        else:
+            percentiles = durations * 99
+
+        # An event is oversold if more tickets were issued or ordered than it has seats, or if the
+        # reservation counter does not match the orders
+        oversold = []
+        for event in Event.objects.filter(pk__in=[e.pk for e in events]):
+            ordered = Order.objects.filter(event=event, is_deleted=False).aggregate(
+                discount=Sum("number_discount"), regular=Sum("number_regular"), orders=Count("pk")
+            )
+            num_ordered = (ordered["discount"] or 0) + (ordered["regular"] or 0)
+            num_issued = Ticket.objects.filter(order__event=event, order__is_deleted=False).count()
+            if (
+                max(num_ordered, num_issued) > event.max_number_tickets
+                or num_ordered != event.tickets_reserved
+                or num_ordered != num_issued
+            ):
+                oversold.append(
+                    {
+                        "event": event.key,
+                        "max_number_tickets": event.max_number_tickets,
+                        "tickets_reserved": event.tickets_reserved,
+                        "tickets_ordered": num_ordered,
+                        "tickets_issued": num_issued,
+                    }
+                )
+
+        return {
+            "database": connection.vendor,
+            "requests": len(results),
+            "concurrency": options["concurrency"],
+            "capacity": options["events"] * options["tickets_per_event"],
+            "demand": len(results) * options["tickets_per_order"],
+            "results": counts,
+            "error_rate": round(counts["error"] / len(results), 4) if results else 0,
+            "most_common_errors": dict(error_messages.most_common(5)),
+            "wall_time_seconds": round(wall_time, 3),
+            "throughput_per_second": round(len(results) / wall_time, 2) if wall_time else None,
+            "latency_ms": {
+                "p50": round(percentiles[49] * 1000, 1),
+                "p95": round(percentiles[94] * 1000, 1),
+                "p99": round(percentiles[98] * 1000, 1),
+                "max": round(durations[-1] * 1000, 1),
+            }
+            if durations
+            else None,
+            "oversold_events": oversold,
+        }
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ct.logic.reissue import generate_pdfs_zip, send_event_pdfs
+from ct.models.event import Event
+
+
+class Command(BaseCommand):
+    help = (
+        "Renders the invoices and the existing tickets of all orders of an event again, e.g. after "
+        "its time or location changed. The PDFs are written into a ZIP archive or sent to the "
+        "customers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("event", help="Key of the event.")
+        parser.add_argument("--zip", help="Path of the ZIP archive to write.")
+        parser.add_argument(
+            "--send", action="store_true", help="Send the PDFs to the customers via email."
+        )
+
+    def handle(self, *args, **options):
+        if not options["zip"] and not options["send"]:
+            raise CommandError("Bitte --zip und/oder --send angeben.")
+        try:
+            event = Event.objects.get(key=options["event"])
+        except Event.DoesNotExist:
+            raise CommandError(f"Konzert {options['event']} existiert nicht.")
+
+        if options["zip"]:
+            with open(options["zip"], "wb") as file:
+                for chunk in generate_pdfs_zip([event]):
+                    file.write(chunk)
+            self.stdout.write(f"PDFs gespeichert in {options['zip']}.")
+
+        if options["send"]:
+            num_sent, num_failed = send_event_pdfs(event)
+            self.stdout.write(f"{num_sent} E-Mails versendet, {num_failed} fehlgeschlagen.")
@@ -0,0 +1,77 @@
+import multiprocessing
+import os
+import socket
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from ct.constants import RENDER_POOL_SIZE
+from ct.logic.fulfillment import run_worker
+from ct.logic.render_pool import set_render_pool_size
+
+
+def start_worker(worker_id: str, once: bool, concurrency: int, render_pool_size: int):
+    set_render_pool_size(render_pool_size)
+    run_worker(worker_id, once=once, concurrency=concurrency)
+
+
+class Command(BaseCommand):
+    help = "Renders invoices and tickets of new orders and sends them via email."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help="Number of worker processes to start.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help=(
+                "Number of jobs each worker process handles at the same time. The PDFs are "
+                "rendered by a pool of RENDER_POOL_SIZE processes per worker process (default: "
+                "number of cores divided by the number of worker processes)."
+            ),
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Stop as soon as there are no more jobs, instead of waiting for new ones.",
+        )
+
+    def handle(self, *args, **options):
+        base_id = f"{socket.gethostname()}-{os.getpid()}"
+
+        if options["processes"] <= 1:
+            num_processed = run_worker(
+                base_id, once=options["once"], concurrency=options["concurrency"]
+            )
+            self.stdout.write(f"{num_processed} Bestellungen verarbeitet.")
+            return
+
+        # The worker processes share the cores, unless the pool size was set explicitly. With more
+        # processes than cores, each process renders by itself.
+        render_pool_size = RENDER_POOL_SIZE
+        if "RENDER_POOL_SIZE" not in os.environ:
+            render_pool_size //= options["processes"]
+
+        # Database connections must not be shared with the forked processes
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(
+                target=start_worker,
+                args=(
+                    f"{base_id}-{i}",
+                    options["once"],
+                    options["concurrency"],
+                    render_pool_size,
+                ),
+            )
+            for i in range(options["processes"])
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
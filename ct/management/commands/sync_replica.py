@@ -0,0 +1,35 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from ct.db_router import REPLICA_DB
+
+
+class Command(BaseCommand):
+    help = (
+        "Copies the local SQLite database into the local replica (USE_REPLICA=True). A deployed "
+        "PostgreSQL replica is kept up to date by streaming replication instead."
+    )
+
+    def handle(self, *args, **options):
+        if REPLICA_DB not in settings.DATABASES:
+            raise CommandError("Es ist kein Replikat konfiguriert (USE_REPLICA=True).")
+        primary = connections["default"].settings_dict
+        replica = connections[REPLICA_DB].settings_dict
+        sqlite = "django.db.backends.sqlite3"
+        if primary["ENGINE"] != sqlite or replica["ENGINE"] != sqlite:
+            raise CommandError("Nur lokale SQLite-Datenbanken können kopiert werden.")
+
+        # The backup API copies a consistent snapshot, even while the primary is written to
+        connections[REPLICA_DB].close()
+        source = sqlite3.connect(primary["NAME"])
+        target = sqlite3.connect(replica["NAME"])
+        try:
+            with target:
+                source.backup(target)
+        finally:
+            source.close()
+            target.close()
+        self.stdout.write(f"Replikat {replica['NAME']} aktualisiert.")
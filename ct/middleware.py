@@ -0,0 +1,122 @@
+import contextvars
+import math
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from ct.db_router import PRIMARY_COOKIE_NAME
+from ct.logic.metrics import VIEW_DB_DURATION, VIEW_DB_QUERIES, VIEW_DURATION, VIEW_REQUESTS
+
+# The recorder of the current request. A context variable reaches the queries of the request in
+# every thread, also those of async views, which run in executor threads.
+_query_recorder = contextvars.ContextVar("query_recorder", default=None)
+
+
+class QueryRecorder:
+    # Counts and times all queries of a request, also when DEBUG is off
+    def __init__(self):
+        self.num_queries = 0
+        self.duration = 0.0
+
+    def record(self, duration: float) -> None:
+        self.duration += duration
+        self.num_queries += 1
+
+
+def record_query(execute, sql, params, many, context):
+    recorder = _query_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.record(time.perf_counter() - start)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    # Installed once per connection object, which reconnects for later requests
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class MetricsMiddleware:
+    # Records the duration and the database queries of every request per view. For streaming
+    # responses, only the time until the response starts is measured.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        token = _query_recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _query_recorder.reset(token)
+        self.observe(request, response, recorder, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        token = _query_recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _query_recorder.reset(token)
+        self.observe(request, response, recorder, time.perf_counter() - start)
+        return response
+
+    def observe(self, request, response, recorder, duration):
+        match = request.resolver_match
+        view = match.view_name if match else "unresolved"
+        VIEW_DURATION.observe(duration, view=view, method=request.method)
+        VIEW_REQUESTS.inc(view=view, status=response.status_code)
+        VIEW_DB_QUERIES.observe(recorder.num_queries, view=view)
+        VIEW_DB_DURATION.observe(recorder.duration, view=view)
+
+
+class ReadYourWritesMiddleware:
+    # After a request which may have changed data, the client reads from the primary until the
+    # replica has caught up, see ct.db_router
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self.set_primary_cookie(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        self.set_primary_cookie(request, response)
+        return response
+
+    def set_primary_cookie(self, request, response):
+        if settings.USE_REPLICA and request.method not in ("GET", "HEAD", "OPTIONS"):
+            response.set_cookie(
+                PRIMARY_COOKIE_NAME,
+                str(time.time() + settings.REPLICA_MAX_LAG_SECONDS),
+                max_age=math.ceil(settings.REPLICA_MAX_LAG_SECONDS),
+                httponly=True,
+                samesite="Lax",
+            )
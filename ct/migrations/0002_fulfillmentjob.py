@@ -0,0 +1,33 @@
+# Generated by Django 4.1.13 on 2026-10-17 12:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ct', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FulfillmentJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(choices=[('PENDING', 'Wartend'), ('RUNNING', 'In Bearbeitung'), ('DONE', 'Erledigt'), ('FAILED', 'Fehlgeschlagen')], default='PENDING', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('created_date', models.DateTimeField()),
+                ('next_attempt_date', models.DateTimeField()),
+                ('locked_by', models.CharField(blank=True, max_length=100)),
+                ('locked_date', models.DateTimeField(blank=True, null=True)),
+                ('finished_date', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='fulfillment_job', to='ct.order')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='fulfillmentjob',
+            index=models.Index(fields=['state', 'next_attempt_date'], name='ct_job_state_next_idx'),
+        ),
+    ]
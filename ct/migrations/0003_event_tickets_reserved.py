@@ -0,0 +1,32 @@
+# Generated by Django 4.1.13 on 2026-10-17 12:52
+
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def count_reserved_tickets(apps, schema_editor):
+    Event = apps.get_model("ct", "Event")
+    Order = apps.get_model("ct", "Order")
+    reserved_per_event = (
+        Order.objects.filter(is_deleted=False)
+        .values("event_id")
+        .annotate(reserved=Sum(F("number_discount") + F("number_regular")))
+    )
+    for row in reserved_per_event:
+        Event.objects.filter(pk=row["event_id"]).update(tickets_reserved=row["reserved"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ct', '0002_fulfillmentjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='tickets_reserved',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_reserved_tickets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-17 12:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ct', '0004_order_last_modified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='checked_in_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
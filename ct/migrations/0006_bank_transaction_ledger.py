@@ -0,0 +1,34 @@
+# Generated by Django 4.1.13 on 2026-10-17 12:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ct', '0005_ticket_checked_in_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BankTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dedup_key', models.CharField(max_length=64, unique=True)),
+                ('booking_date', models.DateTimeField()),
+                ('reference_text', models.CharField(max_length=500)),
+                ('reference_code', models.CharField(db_index=True, max_length=50)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('import_date', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PaymentBalance',
+            fields=[
+                ('reference_code', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('payment_date', models.DateTimeField(blank=True, null=True)),
+                ('refund_date', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.1.13 on 2026-10-17 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ct', '0006_bank_transaction_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('REMINDER', 'Zahlungserinnerung'), ('WARNING', 'Mahnung')], max_length=20)),
+                ('state', models.CharField(choices=[('RUNNING', 'Läuft'), ('DONE', 'Abgeschlossen'), ('FAILED', 'Fehlgeschlagen')], default='RUNNING', max_length=20)),
+                ('started_date', models.DateTimeField()),
+                ('finished_date', models.DateTimeField(blank=True, null=True)),
+                ('num_total', models.PositiveIntegerField(default=0)),
+                ('num_sent', models.PositiveIntegerField(default=0)),
+                ('num_failed', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.1.13 on 2026-10-17 13:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ct', '0007_reminderrun'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('is_deleted', False), ('is_paid', False), ('reminder_sent', False), ('warning_sent', False)), fields=['order_date'], name='ct_order_reminder_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('is_deleted', False), ('is_paid', False), ('reminder_sent', True), ('warning_sent', False)), fields=['reminder_date'], name='ct_order_warning_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['event', 'is_deleted', 'is_paid', 'number_discount', 'number_regular'], name='ct_order_event_stats_idx'),
+        ),
+    ]
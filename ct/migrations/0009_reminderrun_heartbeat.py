@@ -0,0 +1,32 @@
+# Generated by Django 4.1.13 on 2026-10-17 13:39
+
+from django.db import migrations, models
+
+
+def fail_running_runs(apps, schema_editor):
+    # Runs from before the heartbeat cannot be told apart from abandoned ones. Their threads do not
+    # survive the deployment anyway.
+    ReminderRun = apps.get_model("ct", "ReminderRun")
+    ReminderRun.objects.filter(state="RUNNING").update(
+        state="FAILED", last_error="Abgebrochen (Neustart)"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ct', '0008_order_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reminderrun',
+            name='heartbeat_date',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(fail_running_runs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='reminderrun',
+            constraint=models.UniqueConstraint(condition=models.Q(('state', 'RUNNING')), fields=('kind',), name='ct_reminderrun_one_running'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import models
+
+
+class BankTransaction(models.Model):
+    # A single row of an uploaded bank statement. Rows which were already imported with an earlier
+    # (overlapping) statement are recognized by their dedup_key and skipped.
+    dedup_key = models.CharField(max_length=64, unique=True)
+    booking_date = models.DateTimeField()
+    reference_text = models.CharField(max_length=500)
+    reference_code = models.CharField(max_length=50, db_index=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    import_date = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.reference_text} ({self.amount} €)"
+
+
+class PaymentBalance(models.Model):
+    # Sum of all imported bank transactions of a reference code. Updated incrementally with
+    # every newly imported transaction.
+    reference_code = models.CharField(max_length=50, primary_key=True)
+    balance = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    payment_date = models.DateTimeField(null=True, blank=True)
+    refund_date = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.reference_code
@@ -10,6 +10,23 @@ class Event(models.Model):
     conductor = models.CharField(max_length=50)
     max_number_tickets = models.PositiveIntegerField()
     is_active = models.BooleanField(default=True)
+    # Number of tickets of all non-deleted orders. Only updated via the atomic
+    # reserve_tickets/release_tickets in ct.logic.event, never via save().
+    tickets_reserved = models.PositiveIntegerField(default=0)
+
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        # Saving a loaded event must not write back its (possibly outdated) reservation counter,
+        # otherwise e.g. an admin edit during a sale would release reserved tickets
+        if not self._state.adding and not force_insert:
+            if update_fields is None:
+                update_fields = [f.name for f in self._meta.concrete_fields if not f.primary_key]
+            update_fields = [name for name in update_fields if name != "tickets_reserved"]
+        super().save(
+            force_insert=force_insert,
+            force_update=force_update,
+            using=using,
+            update_fields=update_fields,
+        )
 
     def __str__(self):
         time_in_berlin_tz = self.datetime.astimezone(pytz.timezone('Europe/Berlin')).strftime(r'%d.%m.%Y, %H:%M')
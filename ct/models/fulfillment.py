@@ -0,0 +1,46 @@
+from enum import Enum
+
+from django.db import models
+
+from ct.models.order import Order
+
+
+class JobState(Enum):
+    PENDING = "Wartend"
+    RUNNING = "In Bearbeitung"
+    DONE = "Erledigt"
+    FAILED = "Fehlgeschlagen"
+
+
+class FulfillmentJob(models.Model):
+    # Renders the invoice and tickets of an order and sends them via email. Processed by
+    # the workers started with `python manage.py run_fulfillment_worker`.
+    order = models.OneToOneField(
+        Order, on_delete=models.CASCADE, related_name="fulfillment_job"
+    )
+    state = models.CharField(
+        max_length=20,
+        choices=[(s.name, s.value) for s in JobState],
+        default=JobState.PENDING.name,
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    created_date = models.DateTimeField()
+    next_attempt_date = models.DateTimeField()
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_date = models.DateTimeField(null=True, blank=True)
+    finished_date = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["state", "next_attempt_date"], name="ct_job_state_next_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.order_id} ({self.display_state})"
+
+    @property
+    def display_state(self):
+        return JobState[self.state].value
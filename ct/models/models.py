@@ -3,4 +3,7 @@
 from .order import Order
 from .ticket import Ticket  
 from .customer import Customer
-from .event import Event
\ No newline at end of file
+from .event import Event
+from .fulfillment import FulfillmentJob
+from .bank_transaction import BankTransaction, PaymentBalance
+from .reminder_run import ReminderRun
@@ -24,6 +24,35 @@ class Order(models.Model):
     warning_date = models.DateTimeField(null=True, blank=True)
     is_refunded = models.BooleanField(default=False)
     refund_date = models.DateTimeField(null=True, blank=True)
+    # Used by the scanner devices to only sync orders which changed since their last sync.
+    # Has to be set explicitly in queryset updates, as auto_now only applies to save().
+    last_modified = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Payment reminders: only the few unpaid orders without a reminder are indexed
+            models.Index(
+                fields=["order_date"],
+                name="ct_order_reminder_idx",
+                condition=models.Q(
+                    is_paid=False, is_deleted=False, reminder_sent=False, warning_sent=False
+                ),
+            ),
+            # Payment warnings: unpaid orders which were reminded but not warned yet
+            models.Index(
+                fields=["reminder_date"],
+                name="ct_order_warning_idx",
+                condition=models.Q(
+                    is_paid=False, is_deleted=False, reminder_sent=True, warning_sent=False
+                ),
+            ),
+            # Per-event statistics and lookups of the orders of an event. Contains all columns of
+            # the statistics query, so that it can be answered from the index alone.
+            models.Index(
+                fields=["event", "is_deleted", "is_paid", "number_discount", "number_regular"],
+                name="ct_order_event_stats_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.reference_code
@@ -0,0 +1,53 @@
+from enum import Enum
+
+from django.db import models
+
+
+class ReminderKind(Enum):
+    REMINDER = "Zahlungserinnerung"
+    WARNING = "Mahnung"
+
+
+class ReminderRunState(Enum):
+    RUNNING = "Läuft"
+    DONE = "Abgeschlossen"
+    FAILED = "Fehlgeschlagen"
+
+
+class ReminderRun(models.Model):
+    # Progress of one background run of payment reminders or warnings
+    kind = models.CharField(max_length=20, choices=[(k.name, k.value) for k in ReminderKind])
+    state = models.CharField(
+        max_length=20,
+        choices=[(s.name, s.value) for s in ReminderRunState],
+        default=ReminderRunState.RUNNING.name,
+    )
+    started_date = models.DateTimeField()
+    # Updated after every batch, see REMINDER_RUN_STALE_SECONDS
+    heartbeat_date = models.DateTimeField(null=True, blank=True)
+    finished_date = models.DateTimeField(null=True, blank=True)
+    num_total = models.PositiveIntegerField(default=0)
+    num_sent = models.PositiveIntegerField(default=0)
+    num_failed = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            # A second run of the same kind would send the same emails again
+            models.UniqueConstraint(
+                fields=["kind"],
+                condition=models.Q(state="RUNNING"),
+                name="ct_reminderrun_one_running",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.display_kind} {self.started_date}"
+
+    @property
+    def display_kind(self):
+        return ReminderKind[self.kind].value
+
+    @property
+    def display_state(self):
+        return ReminderRunState[self.state].value
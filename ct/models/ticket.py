@@ -15,6 +15,7 @@ class Ticket(models.Model):
         max_length=30, choices=[(t.name, t.value) for t in TicketType]
     )
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
+    checked_in_at = models.DateTimeField(null=True, blank=True, db_index=True)
 
     def __str__(self):
         return self.ticket_code
@@ -1,8 +1,31 @@
+import json
+from datetime import timedelta
+
 from rest_framework.response import Response
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.authentication import BasicAuthentication
+from ct.constants import (
+    CHECK_IN_MAX_BATCH_SIZE,
+    TICKETS_API_MAX_PAGE_SIZE,
+    TICKETS_API_SYNC_OVERLAP_SECONDS,
+)
+from ct.db_router import replica_reads
+from ct.logic.checkin import check_in_tickets
+from ct.logic.event_cache import get_active_events
+from ct.logic.ticket_token import (
+    TICKET_TOKEN_TAG_LENGTH,
+    TICKET_TOKEN_VERSION,
+    get_event_verification_key,
+    sign_ticket_code,
+)
 from ct.models.event import Event
 
 from ct.models.ticket import Ticket
@@ -12,27 +35,148 @@ class Events(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        events = Event.objects.filter(is_active=True)
-        event_tuples = [(e.key, str(e)) for e in events]
+        event_tuples = [(e.key, e.label) for e in get_active_events()]
         return Response(event_tuples)
     
 
 class Tickets(APIView):
+    # Returns the tickets of an event as a streamed JSON list. Optional query parameters:
+    # - since: ISO timestamp, only returns tickets whose order changed or which were checked in
+    #   afterwards. Devices should
+    #   pass the X-Sync-Timestamp header of their previous sync.
+    # - limit and cursor: paginate by ticket code. The next cursor is returned in X-Next-Cursor.
+    #   With USE_ASYNC_VIEWS, at most TICKETS_API_MAX_PAGE_SIZE tickets are returned without limit,
+    #   see ct.logic.async_executor.run_view_in_executor.
     authentication_classes = [BasicAuthentication]
     permission_classes = [IsAuthenticated]
 
+    @method_decorator(replica_reads)
     def get(self, request, event_id, *args, **kwargs):
         event = get_object_or_404(Event, key=event_id)
-        tickets = Ticket.objects.filter(order__event=event)
+        sync_timestamp = timezone.now() - timedelta(seconds=TICKETS_API_SYNC_OVERLAP_SECONDS)
+
+        # The rows are streamed after the view returned, so the database is chosen now
+        tickets = Ticket.objects.filter(order__event=event).order_by("ticket_code")
+        tickets = tickets.using(tickets.db)
+
+        since = request.query_params.get("since")
+        if since:
+            # An unencoded "+" of the UTC offset arrives as a space
+            since_datetime = parse_datetime(since.replace(" ", "+"))
+            if since_datetime is None:
+                return Response({"error": "Invalid timestamp for 'since'"}, status=400)
+            tickets = tickets.filter(
+                Q(order__last_modified__gt=since_datetime)
+                | Q(checked_in_at__gt=since_datetime)
+            )
+
+        cursor = request.query_params.get("cursor")
+        if cursor:
+            tickets = tickets.filter(ticket_code__gt=cursor)
+
+        # Only the needed columns, fetched in the same query as the orders
+        rows = tickets.values_list(
+            "ticket_code", "type", "order__is_paid", "order__is_deleted", "checked_in_at"
+        )
+
+        next_cursor = None
+        limit = request.query_params.get("limit")
+        if limit:
+            try:
+                limit = min(int(limit), TICKETS_API_MAX_PAGE_SIZE)
+            except ValueError:
+                limit = 0
+            if limit < 1:
+                return Response({"error": "Invalid value for 'limit'"}, status=400)
+        elif settings.USE_ASYNC_VIEWS:
+            # Async responses are buffered, so they are bounded to one page. Devices which do not
+            # paginate still get the tickets of the first page and X-Next-Cursor.
+            limit = TICKETS_API_MAX_PAGE_SIZE
 
-        ticket_data = [
+        if limit:
+            # One additional row tells whether there is another page
+            rows = list(rows[: limit + 1])
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = rows[-1][0]
+        else:
+            rows = rows.iterator(chunk_size=2000)
+
+        response = StreamingHttpResponse(
+            stream_ticket_rows(rows, get_event_verification_key(event.key)),
+            content_type="application/json",
+        )
+        response["X-Sync-Timestamp"] = sync_timestamp.isoformat()
+        # Version of "ticket_token". Scanners which do not know this version can only match
+        # "ticket_code".
+        response["X-Ticket-Token-Version"] = str(TICKET_TOKEN_VERSION)
+        if next_cursor:
+            response["X-Next-Cursor"] = next_cursor
+        return response
+
+
+class VerificationKey(APIView):
+    # Returns the key with which scanner devices can verify the ticket tokens of an event offline.
+    # See ct.logic.ticket_token for the token format.
+    authentication_classes = [BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, event_id, *args, **kwargs):
+        event = get_object_or_404(Event, key=event_id)
+        return Response(
             {
-                "ticket_code": ticket.ticket_code,
-                "type": ticket.type,
-                "is_paid": ticket.order.is_paid,
-                "is_order_deleted": ticket.order.is_deleted
+                "event": event.key,
+                "algorithm": "HMAC-SHA256",
+                "key": get_event_verification_key(event.key).hex(),
+                "token_version": TICKET_TOKEN_VERSION,
+                "tag_length": TICKET_TOKEN_TAG_LENGTH,
             }
-            for ticket in tickets
-        ]
+        )
+
+
+class CheckIn(APIView):
+    # Validates a batch of scanned tickets and marks the valid ones as used. Expects
+    # {"ticket_codes": [...]} with ticket codes or ticket tokens and returns the status of each code.
+    authentication_classes = [BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, event_id, *args, **kwargs):
+        ticket_codes = request.data.get("ticket_codes")
+        if not isinstance(ticket_codes, list) or not all(
+            isinstance(code, str) for code in ticket_codes
+        ):
+            return Response({"error": "'ticket_codes' must be a list of strings"}, status=400)
+        if len(ticket_codes) > CHECK_IN_MAX_BATCH_SIZE:
+            return Response(
+                {"error": f"At most {CHECK_IN_MAX_BATCH_SIZE} ticket codes per request"},
+                status=400,
+            )
+
+        return Response(check_in_tickets(event_id, ticket_codes))
+
 
-        return Response(ticket_data)
\ No newline at end of file
+def stream_ticket_rows(rows, verification_key: bytes, chunk_size=500):
+    # Streams a JSON list without holding the whole response in memory
+    yield "["
+    chunk = []
+    is_first = True
+    for ticket_code, type, is_paid, is_order_deleted, checked_in_at in rows:
+        chunk.append(
+            json.dumps(
+                {
+                    "ticket_code": ticket_code,
+                    "ticket_token": sign_ticket_code(ticket_code, verification_key),
+                    "type": type,
+                    "is_paid": is_paid,
+                    "is_order_deleted": is_order_deleted,
+                    "is_checked_in": checked_in_at is not None,
+                }
+            )
+        )
+        if len(chunk) >= chunk_size:
+            yield ("" if is_first else ",") + ",".join(chunk)
+            is_first = False
+            chunk = []
+    if chunk:
+        yield ("" if is_first else ",") + ",".join(chunk)
+    yield "]"
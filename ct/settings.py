@@ -12,6 +12,13 @@ load_dotenv(BASE_DIR / ".env")
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.getenv("SECRET_KEY", "debugsecretkey1234")
 
+# Signs the QR codes on the tickets. Changing it invalidates all printed tickets.
+TICKET_TOKEN_SECRET = os.getenv("TICKET_TOKEN_SECRET", SECRET_KEY)
+# Print the signed ticket tokens instead of the ticket codes as QR codes. Only enable it once all
+# scanners understand the tokens (see ct.logic.ticket_token and X-Ticket-Token-Version of the
+# tickets API), older scanners only match the ticket codes.
+PRINT_TICKET_TOKENS = os.getenv("PRINT_TICKET_TOKENS", "False") == "True"
+
 IS_DEPLOYED = os.getenv("IS_DEPLOYED", "False") == "True"
 DEBUG = not IS_DEPLOYED
 
@@ -31,6 +38,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "ct.middleware.MetricsMiddleware",
+    "ct.middleware.ReadYourWritesMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -64,6 +73,10 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "ct.wsgi.application"
+ASGI_APPLICATION = "ct.asgi.application"
+
+# Async variants of the public views and the API, for serving ct.asgi with an ASGI server
+USE_ASYNC_VIEWS = os.getenv("USE_ASYNC_VIEWS", "False") == "True"
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
@@ -84,6 +97,51 @@ else:
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
             "NAME": BASE_DIR / "db.sqlite3",
+            # Concurrent orders wait for the write lock instead of failing with "database is locked"
+            "OPTIONS": {"timeout": 20},
+        }
+    }
+
+# Optional read replica for read-only views (see ct.db_router). Locally, the replica is a second
+# SQLite file, which is updated with `python manage.py sync_replica`.
+USE_REPLICA = os.getenv("USE_REPLICA", "False") == "True"
+# Reads fall back to the primary if the replica lags behind by more than this
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", 5))
+
+if USE_REPLICA:
+    if IS_DEPLOYED:
+        DATABASES["replica"] = {
+            **DATABASES["default"],
+            "HOST": os.getenv("POSTGRES_REPLICA_HOST", "localhost"),
+            "PORT": os.getenv("POSTGRES_REPLICA_PORT", "5432"),
+            "TEST": {"MIRROR": "default"},
+        }
+    else:
+        DATABASES["replica"] = {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db_replica.sqlite3",
+            "TEST": {"MIRROR": "default"},
+        }
+    DATABASE_ROUTERS = ["ct.db_router.ReplicaRouter"]
+
+# Rendered invoices and tickets, see ct.logic.pdf_store. They contain customer data and are kept
+# outside of the source tree.
+PDF_STORE_DIR = Path(os.getenv("PDF_STORE_DIR", Path.home() / ".cache" / "ct" / "pdf_store"))
+
+# Cache for the dashboard statistics and the ticket availability. When deployed, the cache is shared
+# between all processes, so that an invalidation reaches every process.
+if IS_DEPLOYED:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            # Outside of the source tree, like the PDF store
+            "LOCATION": os.getenv("CACHE_DIR", Path.home() / ".cache" / "ct" / "django_cache"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
         }
     }
 
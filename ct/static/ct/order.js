@@ -0,0 +1,28 @@
+// The order page is cached for all anonymous visitors. The remaining tickets per event and the
+// CSRF token are filled in here. The submit button stays disabled until the token is known, so
+// that no order fails with an invalid CSRF token.
+(function () {
+  const form = document.getElementById("create_order_form");
+  const submitButton = document.getElementById("create_order_submit");
+
+  fetch(form.dataset.availabilityUrl, { credentials: "same-origin" })
+    .then((response) => {
+      if (!response.ok) {
+        throw new Error(`Availability request failed with status ${response.status}`);
+      }
+      return response.json();
+    })
+    .then((availability) => {
+      for (const option of form.elements.event.options) {
+        if (option.value in availability.remaining_tickets) {
+          option.text += ` (${availability.remaining_tickets[option.value]} Plätze verfügbar)`;
+        }
+      }
+
+      form.elements.csrfmiddlewaretoken.value = availability.csrf_token;
+      submitButton.disabled = false;
+    })
+    .catch(() => {
+      document.getElementById("create_order_error").hidden = false;
+    });
+})();
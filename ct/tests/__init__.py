@@ -0,0 +1,46 @@
+import json
+from datetime import timedelta
+
+from django.utils import timezone
+
+from ct.models.event import Event
+from ct.models.order import Order
+from ct.models.ticket import Ticket, TicketType
+
+
+# Objects shared by the test modules. Keyword arguments override the defaults.
+def create_event(key="test", **fields) -> Event:
+    return Event.objects.create(
+        **{
+            "key": key,
+            "location": "Stadthalle Heidelberg",
+            "datetime": timezone.now() + timedelta(days=30),
+            "program": json.dumps(["L. v. Beethoven: Sinfonie Nr. 5"]),
+            "conductor": "Johann S. Bach",
+            "max_number_tickets": 10,
+            **fields,
+        }
+    )
+
+
+def create_order(event: Event, reference_code="12345678", **fields) -> Order:
+    return Order.objects.create(
+        **{
+            "reference_code": reference_code,
+            "name": "Max Mustermann",
+            "order_date": timezone.now(),
+            "address": "Bachweg 5, 12345 Eisenach",
+            "email": "max@example.com",
+            "event": event,
+            "number_regular": 1,
+            "delete_code": "0",
+            **fields,
+        }
+    )
+
+
+def create_tickets(order: Order, ticket_codes: list) -> list:
+    return [
+        Ticket.objects.create(ticket_code=code, order=order, type=TicketType.REGULAR.name)
+        for code in ticket_codes
+    ]
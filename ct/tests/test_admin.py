@@ -0,0 +1,84 @@
+import zipfile
+from io import BytesIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.http import FileResponse
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ct.logic.event import get_remaining_tickets, reserve_tickets
+from ct.logic.order import delete_order
+from ct.models.order import Order
+from ct.tests import create_event, create_order
+
+
+def render_event_pdfs(event):
+    for order in event.order_set.all():
+        yield order, b"%PDF"
+
+
+@mock.patch("ct.logic.reissue.render_event_pdfs", render_event_pdfs)
+class DownloadPdfsTest(TestCase):
+    def setUp(self):
+        create_order(create_event())
+        User.objects.create_superuser("admin", password="secret")
+        self.client.login(username="admin", password="secret")
+
+    def download(self):
+        response = self.client.post(
+            reverse("admin:ct_event_changelist"),
+            {"action": "download_pdfs", "_selected_action": ["test"]},
+        )
+        archive = zipfile.ZipFile(BytesIO(b"".join(response.streaming_content)))
+        return response, archive.namelist()
+
+    def test_streamed(self):
+        response, names = self.download()
+        self.assertEqual(names, ["test/12345678.pdf"])
+
+    @override_settings(USE_ASYNC_VIEWS=True)
+    def test_written_to_file_in_async_mode(self):
+        response, names = self.download()
+        self.assertIsInstance(response, FileResponse)
+        self.assertIn("tickets.zip", response["Content-Disposition"])
+        self.assertEqual(names, ["test/12345678.pdf"])
+
+
+@mock.patch("ct.logic.order.send_email")
+class OrderAdminTest(TestCase):
+    def setUp(self):
+        event = create_event()
+        reserve_tickets("test", 3)
+        create_order(event, reference_code="11111111", number_regular=2)
+        create_order(event, reference_code="22222222", number_regular=1)
+        User.objects.create_superuser("admin", password="secret")
+        self.client.login(username="admin", password="secret")
+
+    def run_action(self, action, **data):
+        return self.client.post(
+            reverse("admin:ct_order_changelist"),
+            {"action": action, "_selected_action": ["11111111", "22222222"], **data},
+        )
+
+    def test_delete_releases_tickets(self, send_email):
+        self.run_action("delete_selected", post="yes")
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(get_remaining_tickets("test"), 10)
+
+    def test_delete_cancelled_order_releases_nothing_twice(self, send_email):
+        delete_order("11111111", "0")
+        self.run_action("delete_selected", post="yes")
+        self.assertEqual(get_remaining_tickets("test"), 10)
+
+    def test_cancel_releases_tickets(self, send_email):
+        self.run_action("cancel_orders")
+        self.assertEqual(Order.objects.filter(is_deleted=True).count(), 2)
+        self.assertEqual(get_remaining_tickets("test"), 10)
+        self.assertEqual(send_email.call_count, 2)
+
+    def test_reservation_fields_are_read_only(self, send_email):
+        response = self.client.get(reverse("admin:ct_order_change", args=["11111111"]))
+        self.assertContains(response, 'name="name"')
+        for field in ["event", "number_discount", "number_regular", "is_deleted"]:
+            self.assertNotContains(response, f'name="{field}"')
@@ -0,0 +1,22 @@
+from io import BytesIO
+
+from django.test import SimpleTestCase
+from reportlab.pdfgen.canvas import Canvas
+
+from ct.logic.assets import draw_image
+
+
+class DrawImageTest(SimpleTestCase):
+    # draw_image relies on internals of ReportLab, this fails if they change
+    def test_image_is_embedded_once(self):
+        buffer = BytesIO()
+        canvas = Canvas(buffer)
+        for _ in range(2):
+            draw_image(canvas, "logo.png", 100, 100, width=50)
+            draw_image(canvas, "logo.png", 200, 100, height=50)
+            canvas.showPage()
+        canvas.save()
+
+        pdf = buffer.getvalue()
+        self.assertTrue(pdf.startswith(b"%PDF"))
+        self.assertEqual(pdf.count(b"/Subtype /Image"), 1)
@@ -0,0 +1,92 @@
+from decimal import Decimal
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+
+from ct.logic.bank_statement import process_bank_statement
+from ct.models.bank_transaction import BankTransaction, PaymentBalance
+from ct.models.order import Order
+from ct.tests import create_event, create_order
+
+
+def create_statement(*rows) -> SimpleUploadedFile:
+    lines = ["Buchungstag;Verwendungszweck;Betrag"] + [";".join(row) for row in rows]
+    return SimpleUploadedFile("statement.csv", "\n".join(lines).encode("utf-8"))
+
+
+class BankStatementTest(TestCase):
+    def setUp(self):
+        event = create_event()
+        # 20 € each
+        create_order(event, reference_code="11111111")
+        create_order(event, reference_code="22222222")
+
+    def get_balance(self, reference_code) -> Decimal:
+        return PaymentBalance.objects.get(pk=reference_code).balance
+
+    def test_payment(self):
+        report = process_bank_statement(
+            create_statement(("01.03.2024", "Karten 11111111", "20,00"))
+        )
+
+        self.assertEqual([row[0] for row in report], ["BEZAHLT"])
+        self.assertTrue(Order.objects.get(pk="11111111").is_paid)
+        self.assertEqual(self.get_balance("11111111"), Decimal("20.00"))
+
+    def test_same_statement_twice(self):
+        statement = [("01.03.2024", "Karten 11111111", "20,00")]
+        process_bank_statement(create_statement(*statement))
+        report = process_bank_statement(create_statement(*statement))
+
+        self.assertEqual(report, [])
+        self.assertEqual(BankTransaction.objects.count(), 1)
+        self.assertEqual(self.get_balance("11111111"), Decimal("20.00"))
+
+    def test_overlapping_statements(self):
+        process_bank_statement(
+            create_statement(
+                ("01.03.2024", "Karten 11111111", "10,00"),
+                ("02.03.2024", "Karten 22222222", "20,00"),
+            )
+        )
+        report = process_bank_statement(
+            create_statement(
+                ("02.03.2024", "Karten 22222222", "20,00"),
+                ("03.03.2024", "Karten 11111111", "10,00"),
+            )
+        )
+
+        # Only the new row is processed, it completes the payment in two installments
+        self.assertEqual(report, [["BEZAHLT", "11111111", "Bestellung 11111111 wurde bezahlt."]])
+        self.assertEqual(BankTransaction.objects.count(), 3)
+        self.assertEqual(self.get_balance("11111111"), Decimal("20.00"))
+        self.assertEqual(self.get_balance("22222222"), Decimal("20.00"))
+
+    def test_identical_transfers_on_the_same_day(self):
+        statement = [
+            ("01.03.2024", "Karten 11111111", "10,00"),
+            ("01.03.2024", "Karten 11111111", "10,00"),
+        ]
+        process_bank_statement(create_statement(*statement))
+        self.assertEqual(BankTransaction.objects.count(), 2)
+        self.assertEqual(self.get_balance("11111111"), Decimal("20.00"))
+        self.assertTrue(Order.objects.get(pk="11111111").is_paid)
+
+        # Both are recognized again in a later statement
+        process_bank_statement(create_statement(*statement))
+        self.assertEqual(BankTransaction.objects.count(), 2)
+        self.assertEqual(self.get_balance("11111111"), Decimal("20.00"))
+
+    def test_dry_run_writes_nothing(self):
+        report = process_bank_statement(
+            create_statement(("01.03.2024", "Karten 11111111", "20,00")), dry_run=True
+        )
+
+        self.assertEqual([row[0] for row in report], ["BEZAHLT"])
+        self.assertFalse(BankTransaction.objects.exists())
+        self.assertFalse(PaymentBalance.objects.exists())
+        self.assertFalse(Order.objects.get(pk="11111111").is_paid)
+
+        # The statement is processed completely by the real import afterwards
+        process_bank_statement(create_statement(("01.03.2024", "Karten 11111111", "20,00")))
+        self.assertTrue(Order.objects.get(pk="11111111").is_paid)
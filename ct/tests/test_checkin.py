@@ -0,0 +1,78 @@
+from django.test import TestCase
+from django.utils import timezone
+
+from ct.logic.checkin import CheckInStatus, check_in_tickets
+from ct.logic.ticket_token import create_ticket_token
+from ct.models.ticket import Ticket
+from ct.tests import create_event, create_order, create_tickets
+
+PAID = "10000000-0000-0000-0000-000000000000"
+UNPAID = "20000000-0000-0000-0000-000000000000"
+CANCELLED = "30000000-0000-0000-0000-000000000000"
+USED = "40000000-0000-0000-0000-000000000000"
+OTHER_EVENT = "50000000-0000-0000-0000-000000000000"
+UNKNOWN = "60000000-0000-0000-0000-000000000000"
+
+
+class CheckInTest(TestCase):
+    def setUp(self):
+        event = create_event()
+        create_tickets(create_order(event, reference_code="11111111", is_paid=True), [PAID])
+        create_tickets(create_order(event, reference_code="22222222"), [UNPAID])
+        create_tickets(
+            create_order(event, reference_code="33333333", is_paid=True, is_deleted=True),
+            [CANCELLED],
+        )
+        create_tickets(create_order(event, reference_code="44444444", is_paid=True), [USED])
+        Ticket.objects.filter(pk=USED).update(checked_in_at=timezone.now())
+
+        other_event = create_event(key="other")
+        create_tickets(
+            create_order(other_event, reference_code="55555555", is_paid=True), [OTHER_EVENT]
+        )
+
+    def check_in(self, codes) -> dict:
+        return {r["ticket_code"]: r["status"] for r in check_in_tickets("test", codes)}
+
+    def test_statuses(self):
+        statuses = self.check_in([PAID, UNPAID, CANCELLED, USED, UNKNOWN])
+
+        self.assertEqual(
+            statuses,
+            {
+                PAID: CheckInStatus.VALID.value,
+                UNPAID: CheckInStatus.UNPAID.value,
+                CANCELLED: CheckInStatus.CANCELLED.value,
+                USED: CheckInStatus.ALREADY_USED.value,
+                UNKNOWN: CheckInStatus.UNKNOWN.value,
+            },
+        )
+        self.assertIsNotNone(Ticket.objects.get(pk=PAID).checked_in_at)
+        self.assertIsNone(Ticket.objects.get(pk=UNPAID).checked_in_at)
+
+    def test_valid_ticket_only_once(self):
+        self.assertEqual(self.check_in([PAID]), {PAID: CheckInStatus.VALID.value})
+        self.assertEqual(self.check_in([PAID]), {PAID: CheckInStatus.ALREADY_USED.value})
+
+    def test_token_and_code_in_one_batch(self):
+        token = create_ticket_token(PAID, "test")
+        statuses = self.check_in([token, USED])
+
+        self.assertEqual(
+            statuses,
+            {token: CheckInStatus.VALID.value, USED: CheckInStatus.ALREADY_USED.value},
+        )
+
+    def test_ticket_of_another_event(self):
+        token = create_ticket_token(OTHER_EVENT, "other")
+        statuses = self.check_in([OTHER_EVENT, token])
+
+        self.assertEqual(
+            statuses,
+            {OTHER_EVENT: CheckInStatus.UNKNOWN.value, token: CheckInStatus.UNKNOWN.value},
+        )
+        self.assertIsNone(Ticket.objects.get(pk=OTHER_EVENT).checked_in_at)
+
+    def test_forged_token(self):
+        token = create_ticket_token(PAID, "other")
+        self.assertEqual(self.check_in([token]), {token: CheckInStatus.UNKNOWN.value})
@@ -0,0 +1,43 @@
+from django.test import TestCase
+
+from ct.logic.event import get_remaining_tickets, release_tickets, reserve_tickets
+from ct.models.event import Event
+from ct.tests import create_event
+
+
+class TicketReservationTest(TestCase):
+    def setUp(self):
+        self.event = create_event()
+
+    def test_reserve_and_release(self):
+        self.assertTrue(reserve_tickets("test", 4))
+        self.assertTrue(reserve_tickets("test", 6))
+        self.assertFalse(reserve_tickets("test", 1))
+        self.assertEqual(get_remaining_tickets("test"), 0)
+
+        release_tickets("test", 3)
+        self.assertEqual(get_remaining_tickets("test"), 3)
+        release_tickets("test", 20)
+        self.assertEqual(get_remaining_tickets("test"), 10)
+
+    def test_save_keeps_reserved_tickets(self):
+        stale = Event.objects.get(key="test")
+        self.assertTrue(reserve_tickets("test", 4))
+
+        stale.location = "Neue Halle"
+        stale.save()
+
+        event = Event.objects.get(key="test")
+        self.assertEqual(event.location, "Neue Halle")
+        self.assertEqual(event.tickets_reserved, 4)
+
+    def test_save_with_update_fields_keeps_reserved_tickets(self):
+        stale = Event.objects.get(key="test")
+        self.assertTrue(reserve_tickets("test", 4))
+
+        stale.max_number_tickets = 20
+        stale.save(update_fields=["max_number_tickets", "tickets_reserved"])
+
+        event = Event.objects.get(key="test")
+        self.assertEqual(event.max_number_tickets, 20)
+        self.assertEqual(event.tickets_reserved, 4)
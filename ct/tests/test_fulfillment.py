@@ -0,0 +1,62 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from ct.logic.fulfillment import claim_next_job, enqueue_fulfillment, process_job
+from ct.models.fulfillment import FulfillmentJob, JobState
+from ct.tests import create_event, create_order, create_tickets
+
+
+@mock.patch("ct.logic.fulfillment.send_email_invoice_and_tickets")
+@mock.patch("ct.logic.fulfillment.get_or_render_pdf", return_value=b"%PDF")
+class ProcessJobTest(TestCase):
+    def setUp(self):
+        order = create_order(create_event())
+        create_tickets(order, ["10000000-0000-0000-0000-000000000000"])
+        enqueue_fulfillment(order)
+
+    def take_over(self):
+        # Another worker reclaims the job after the lock timed out
+        FulfillmentJob.objects.update(locked_by="worker-2", locked_date=timezone.now())
+
+    def test_done(self, render, send_email):
+        process_job(claim_next_job("worker-1"))
+
+        send_email.assert_called_once()
+        job = FulfillmentJob.objects.get()
+        self.assertEqual(job.state, JobState.DONE.name)
+        self.assertEqual(job.locked_by, "")
+
+    def test_taken_over_before_sending(self, render, send_email):
+        job = claim_next_job("worker-1")
+        self.take_over()
+        with self.assertLogs("ct.logic.fulfillment", "WARNING"):
+            process_job(job)
+
+        send_email.assert_not_called()
+        job = FulfillmentJob.objects.get()
+        self.assertEqual(job.state, JobState.RUNNING.name)
+        self.assertEqual(job.locked_by, "worker-2")
+
+    def test_taken_over_while_sending(self, render, send_email):
+        send_email.side_effect = lambda order, pdf: self.take_over()
+        with self.assertLogs("ct.logic.fulfillment", "WARNING"):
+            process_job(claim_next_job("worker-1"))
+
+        job = FulfillmentJob.objects.get()
+        self.assertEqual(job.state, JobState.RUNNING.name)
+        self.assertEqual(job.locked_by, "worker-2")
+
+    def test_failure_is_dropped_after_take_over(self, render, send_email):
+        def fail(order, pdf):
+            self.take_over()
+            raise OSError("Connection refused")
+
+        send_email.side_effect = fail
+        with self.assertLogs("ct.logic.fulfillment", "WARNING"):
+            process_job(claim_next_job("worker-1"))
+
+        job = FulfillmentJob.objects.get()
+        self.assertEqual(job.state, JobState.RUNNING.name)
+        self.assertEqual(job.last_error, "")
@@ -0,0 +1,41 @@
+import smtplib
+from email.message import EmailMessage
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ct.logic.mail import SMTPConnectionPool
+
+
+def create_message(subject: str) -> EmailMessage:
+    msg = EmailMessage()
+    msg["Subject"] = subject
+    msg.set_content("Test")
+    return msg
+
+
+class SendMessagesTest(SimpleTestCase):
+    def setUp(self):
+        self.pool = SMTPConnectionPool(
+            "localhost", 587, "sender@example.com", "secret", max_size=1
+        )
+        self.messages = [
+            (create_message("Erste"), ["a@example.com"]),
+            (create_message("Zweite"), ["b@example.com"]),
+        ]
+
+    @mock.patch("ct.logic.mail.smtplib.SMTP")
+    def test_failed_connect_fails_only_its_message(self, smtp_class):
+        smtp_class.side_effect = [ConnectionRefusedError(), mock.MagicMock()]
+        with self.assertLogs("ct.logic.mail", "ERROR"):
+            results = self.pool.send_messages(self.messages)
+        self.assertEqual(results, [False, True])
+
+    @mock.patch("ct.logic.mail.smtplib.SMTP")
+    def test_failed_login_fails_all_messages(self, smtp_class):
+        smtp_class.return_value.login.side_effect = smtplib.SMTPAuthenticationError(535, b"")
+        with self.assertLogs("ct.logic.mail", "ERROR"):
+            results = self.pool.send_messages(self.messages)
+        self.assertEqual(results, [False, False])
+        # The slot is released again
+        self.assertTrue(self.pool.slots.acquire(blocking=False))
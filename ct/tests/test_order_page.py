@@ -0,0 +1,48 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+
+from ct.logic.event_cache import clear_local_cache
+from ct.models.order import Order
+from ct.tests import create_event
+
+
+class CachedOrderPageTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_local_cache()
+        create_event()
+        self.client = Client(enforce_csrf_checks=True)
+
+    def order(self, csrf_token):
+        return self.client.post(
+            "/",
+            {
+                "csrfmiddlewaretoken": csrf_token,
+                "name": "Max Mustermann",
+                "address_street": "Bachweg",
+                "address_number": "5",
+                "address_zip": "12345",
+                "address_city": "Eisenach",
+                "email": "max@example.com",
+                "event": "test",
+                "number_discount": 0,
+                "number_regular": 2,
+                "accept_agb": "on",
+            },
+        )
+
+    def test_order_with_token_from_availability(self):
+        html = self.client.get("/").content.decode()
+        self.assertIn('name="csrfmiddlewaretoken" value=""', html)
+
+        availability = self.client.get("/availability").json()
+        self.assertEqual(availability["remaining_tickets"], {"test": 10})
+
+        response = self.order(availability["csrf_token"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_uncached_page_contains_token(self):
+        html = self.client.get("/?uncached").content.decode()
+        self.assertNotIn('name="csrfmiddlewaretoken" value=""', html)
+        self.assertNotIn("order.js", html)
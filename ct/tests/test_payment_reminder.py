@@ -0,0 +1,76 @@
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from ct.constants import REMINDER_RUN_STALE_SECONDS
+from ct.logic.payment_reminder import dispatch_run, rate_limiter, send_batch, start_run
+from ct.models.order import Order
+from ct.models.reminder_run import ReminderKind, ReminderRun, ReminderRunState
+from ct.tests import create_event, create_order
+
+
+@mock.patch("ct.logic.payment_reminder.threading.Thread")
+class StartRunTest(TestCase):
+    def create_running_run(self, heartbeat_age_seconds):
+        date = timezone.now() - timedelta(seconds=heartbeat_age_seconds)
+        return ReminderRun.objects.create(
+            kind=ReminderKind.REMINDER.name, started_date=date, heartbeat_date=date
+        )
+
+    def test_running_run_blocks_new_run(self, thread):
+        self.create_running_run(heartbeat_age_seconds=10)
+        self.assertIsNone(start_run(ReminderKind.REMINDER, Order.objects.none()))
+        thread.assert_not_called()
+
+    def test_stale_run_is_failed_and_replaced(self, thread):
+        stale_run = self.create_running_run(heartbeat_age_seconds=REMINDER_RUN_STALE_SECONDS + 1)
+
+        run = start_run(ReminderKind.REMINDER, Order.objects.none())
+
+        self.assertIsNotNone(run)
+        thread.assert_called_once()
+        stale_run.refresh_from_db()
+        self.assertEqual(stale_run.state, ReminderRunState.FAILED.name)
+
+    def test_other_kind_does_not_block(self, thread):
+        self.create_running_run(heartbeat_age_seconds=10)
+        self.assertIsNotNone(start_run(ReminderKind.WARNING, Order.objects.none()))
+
+
+@mock.patch("ct.logic.payment_reminder.close_old_connections")
+class SendRunTest(TestCase):
+    def setUp(self):
+        event = create_event()
+        self.orders = [
+            create_order(event, reference_code=f"1000000{i}", order_date=timezone.now())
+            for i in range(3)
+        ]
+        self.run = ReminderRun.objects.create(
+            kind=ReminderKind.REMINDER.name,
+            started_date=timezone.now(),
+            heartbeat_date=timezone.now() - timedelta(minutes=5),
+        )
+
+    @mock.patch("ct.logic.mail.smtplib.SMTP")
+    def test_rate_limit_applies_to_each_sent_email(self, smtp_class, close_old_connections):
+        sendmail = smtp_class.return_value.sendmail
+        num_sent_before_wait = []
+        with mock.patch.object(
+            rate_limiter, "wait", lambda: num_sent_before_wait.append(sendmail.call_count)
+        ):
+            send_batch(self.run, ReminderKind.REMINDER, self.orders)
+
+        self.assertEqual(num_sent_before_wait, [0, 1, 2])
+        self.assertEqual(Order.objects.filter(reminder_sent=True).count(), 3)
+
+    @mock.patch("ct.logic.payment_reminder.REMINDER_RUN_HEARTBEAT_SECONDS", 0.01)
+    @mock.patch("ct.logic.payment_reminder.send_batch", lambda *args: time.sleep(0.1))
+    def test_heartbeat_while_batches_are_queued(self, close_old_connections):
+        dispatch_run(self.run, ReminderKind.REMINDER, self.orders)
+
+        self.run.refresh_from_db()
+        self.assertEqual(self.run.state, ReminderRunState.DONE.name)
+        self.assertGreater(self.run.heartbeat_date, timezone.now() - timedelta(seconds=10))
@@ -0,0 +1,27 @@
+from django.test import SimpleTestCase, override_settings
+
+from ct.logic.ticket_token import (
+    create_ticket_token,
+    get_event_verification_key,
+    get_qr_code_content,
+    verify_ticket_token,
+)
+
+TICKET_CODE = "10000000-0000-0000-0000-000000000000"
+
+
+class TicketTokenTest(SimpleTestCase):
+    def test_verify(self):
+        token = create_ticket_token(TICKET_CODE, "test")
+        self.assertEqual(verify_ticket_token(token, get_event_verification_key("test")), TICKET_CODE)
+        self.assertIsNone(verify_ticket_token(token, get_event_verification_key("other")))
+
+    @override_settings(PRINT_TICKET_TOKENS=False)
+    def test_qr_code_contains_ticket_code(self):
+        self.assertEqual(get_qr_code_content(TICKET_CODE, "test"), TICKET_CODE)
+
+    @override_settings(PRINT_TICKET_TOKENS=True)
+    def test_qr_code_contains_token(self):
+        self.assertEqual(
+            get_qr_code_content(TICKET_CODE, "test"), create_ticket_token(TICKET_CODE, "test")
+        )
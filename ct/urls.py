@@ -1,23 +1,40 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 
 from ct.display.views import (
     agb,
+    availability,
+    availability_async,
     create_order_view,
+    create_order_view_async,
     dashboard,
     delete_order_view,
+    delete_order_view_async,
     login_view,
     logout_view,
+    metrics,
     payment_reminder,
     upload_statement,
 )
-from ct.service.api import Events, Tickets
+from ct.logic.async_executor import run_view_in_executor
+from ct.service.api import CheckIn, Events, Tickets, VerificationKey
+
+
+def public_view(sync_view, async_view=None):
+    # With USE_ASYNC_VIEWS (when served by ct.asgi), the async variant of a view is used. Views
+    # without one run in the executor of the async views.
+    if not settings.USE_ASYNC_VIEWS:
+        return sync_view
+    return async_view or run_view_in_executor(sync_view)
+
 
 urlpatterns = [
-    path("", create_order_view, name="create_order"),
+    path("", public_view(create_order_view, create_order_view_async), name="create_order"),
+    path("availability", public_view(availability, availability_async), name="availability"),
     path(
         "delete_order/<str:reference_code>/<str:delete_code>",
-        delete_order_view,
+        public_view(delete_order_view, delete_order_view_async),
         name="delete_order",
     ),
     path("login/", login_view(), name="login"),
@@ -27,7 +44,14 @@ urlpatterns = [
     path("upload_statement", upload_statement, name="upload_statement"),
     path("payment_reminder", payment_reminder, name="payment_reminder"),
     path("dashboard", dashboard, name="dashboard"),
+    path("metrics", metrics, name="metrics"),
     # API
-    path("api/events", Events.as_view(), name="api_events"),
-    path("api/event/<str:event_id>/tickets", Tickets.as_view(), name="api_tickets"),
+    path("api/events", public_view(Events.as_view()), name="api_events"),
+    path("api/event/<str:event_id>/tickets", public_view(Tickets.as_view()), name="api_tickets"),
+    path("api/event/<str:event_id>/checkin", public_view(CheckIn.as_view()), name="api_checkin"),
+    path(
+        "api/event/<str:event_id>/verification_key",
+        public_view(VerificationKey.as_view()),
+        name="api_verification_key",
+    ),
 ]